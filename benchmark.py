@@ -0,0 +1,201 @@
+"""
+Headless benchmark
+
+Replays a scripted or recorded camera path (and any edits) over a freshly generated world,
+without a window, a human at the mouse or a database server, then reports per-stage timings.
+Each frame of the path is one simulation tick. With --no-render only the simulation is run, as fast as it can tick.
+
+Usage:
+    python benchmark.py --path orbit --frames 600
+    python benchmark.py --path recording.json --save-baseline baseline.json
+    python benchmark.py --path flyover --edit-interval 10 --baseline baseline.json
+    python benchmark.py --path flyover --no-render
+
+Exits with status 1 if any stage in BENCHMARK_GATED_STAGES is slower than the baseline.
+"""
+import os
+# SDL's dummy drivers let pygame run without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from main import *
+from camera_path import CameraPath, SCRIPTED_PATHS, addScriptedEdits
+from storage import SQLiteStorage
+import argparse
+import tempfile
+import json
+import sys
+
+
+def createDatabase(voxel_type_count, transparent_type_count, seed):
+    # An in-memory SQLite database, so benchmarks don't need a database server or leave files behind
+    database = SQLiteStorage(":memory:")
+    database.connectToWorldsDatabase()
+    database.connectToVoxelsDatabase("benchmark")
+
+    # A seeded palette, so every run draws the same colours
+    random_generator = np.random.default_rng(seed)
+    colours = random_generator.integers(0, 256, size=(voxel_type_count, 3))
+    # The last transparent_type_count types are transparent
+    transparent = [i >= voxel_type_count - transparent_type_count for i in range(voxel_type_count)]
+    database.addVoxelTypes([(tuple(int(channel) for channel in colour), transparent[i]) for i, colour in enumerate(colours)])
+    return database
+
+
+def loadPath(name, frame_count):
+    # A scripted path by name, or a path recorded in game
+    if name in SCRIPTED_PATHS:
+        return SCRIPTED_PATHS[name](frame_count)
+    return CameraPath.load(name)
+
+
+def runBenchmark(path, seed, voxel_type_count, transparent_type_count, warmup_frames, render=True, memory_budget=MEMORY_BUDGET_MB):
+    pg.init()
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    font = pg.font.Font(None, 24)
+
+    database = createDatabase(voxel_type_count, transparent_type_count, seed)
+    # The history holds every frame of the path, so the report covers all the measured frames rather than the last PROFILER_HISTORY
+    profiler = Profiler(history=max(len(path), 1), export_path=None)
+    renderer = Renderer(screen, SKY_COLOR, font, profiler)
+    terrain_generator = TerrainGenerator(seed)
+
+    compile_start = time.perf_counter()
+    warmUpKernels()
+    compile_time = time.perf_counter() - compile_start
+
+    # Chunks are saved to a temporary folder, so every run starts from the same freshly generated world
+    with tempfile.TemporaryDirectory() as directory:
+        world = World(os.path.join(directory, "benchmark"), CHUNK_SIZE, database, terrain_generator, profiler)
+        world.updateVoxelList()
+        camera = Camera(*path.pose(0))
+        frame = 0
+
+        def simulate(delta):
+            # The path replaces player input
+            position, rotation = path.pose(frame)
+            camera.position = pg.Vector3(position)
+            camera.rotation = pg.Vector3(rotation)
+            for edit_position, type in path.editsAt(frame):
+                world.setVoxel(edit_position, type)
+            world.update(camera)
+
+        engine = Engine(world, camera, renderer, profiler, simulate)
+        governor = MemoryGovernor(profiler, memory_budget)
+
+        simulation_start = time.perf_counter()
+        for frame in range(len(path)):
+            # Warm-up frames include JIT compilation and the initial chunk loads, so they aren't reported
+            if frame == warmup_frames:
+                profiler.reset()
+                simulation_start = time.perf_counter()
+
+            profiler.beginFrame()
+
+            # Exactly one tick per frame, so every run simulates the same poses
+            engine.advance(engine.tick_delta)
+
+            if render:
+                engine.render(1, 0)
+
+                with profiler.stage("flip"):
+                    pg.display.flip()
+
+            governor.update(world, renderer, database)
+
+            profiler.endFrame()
+
+            if frame == 0:
+                # START_TIME is set when main.py is imported, so this includes imports and JIT compilation
+                time_to_first_frame = time.perf_counter() - START_TIME
+
+        simulation_time = time.perf_counter() - simulation_start
+
+    pg.quit()
+
+    report = profiler.summary()
+    report["ticks_per_second"] = round((len(path) - warmup_frames) / simulation_time, 1)
+    report["memory_mb"] = governor.report()
+    report["load_radius"] = world.load_radius
+    report["compile_time"] = round(compile_time, 4)
+    report["time_to_first_frame"] = round(time_to_first_frame, 4)
+    return report
+
+
+def compareToBaseline(report, baseline, tolerance):
+    # Returns a list of human readable regressions
+    regressions = []
+    for stage in BENCHMARK_GATED_STAGES:
+        for percentile in ("p50", "p95"):
+            try:
+                previous = baseline["stages"][stage][percentile]
+            except KeyError:
+                continue
+            current = report["stages"][stage][percentile]
+
+            slowdown = current - previous
+            if slowdown > BENCHMARK_NOISE_FLOOR and current > previous * (1 + tolerance):
+                regressions.append(f"{stage} {percentile}: {previous:.3f}ms -> {current:.3f}ms")
+    return regressions
+
+
+def printReport(report):
+    print(f"{report['frames']} frames of {report['path']}")
+    print(f"  Time to first frame: {report['time_to_first_frame']:.3f}s (compiling kernels: {report['compile_time']:.3f}s)")
+    print(f"  Ticks per second: {report['ticks_per_second']}")
+    for stage, percentiles in report["stages"].items():
+        values = "".join(f"{name} {value:<10.3f}" for name, value in percentiles.items())
+        print(f"  {stage:<19}{values}")
+    for counter, mean in report["counters"].items():
+        print(f"  {counter:<19}mean {mean}")
+    print(f"  Memory at the end (MB), load radius {report['load_radius']}:")
+    for subsystem, megabytes in report["memory_mb"].items():
+        print(f"  {subsystem:<19}{megabytes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark of the voxel engine")
+    parser.add_argument("--path", default="orbit", help=f"One of {', '.join(SCRIPTED_PATHS)}, or a recorded .json path")
+    parser.add_argument("--frames", type=int, default=600, help="Length of scripted paths")
+    parser.add_argument("--warmup", type=int, default=30, help="Frames run before timings are recorded")
+    parser.add_argument("--seed", type=int, default=1, help="Seeds the palette and scripted edits - the terrain is the same for every seed")
+    parser.add_argument("--voxel-types", type=int, default=8)
+    parser.add_argument("--transparent-types", type=int, default=0, help="How many of the voxel types are transparent")
+    parser.add_argument("--edit-interval", type=int, default=0, help="Make a scripted edit every n frames (0 for none)")
+    parser.add_argument("--output", help="Write the report to a .json file")
+    parser.add_argument("--baseline", help="Compare against a report saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="Save the report as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=BENCHMARK_TOLERANCE)
+    parser.add_argument("--no-render", action="store_true", help="Only run the simulation, without rendering")
+    parser.add_argument("--memory-budget", type=float, default=MEMORY_BUDGET_MB, help="Memory budget in MB")
+    args = parser.parse_args()
+
+    path = loadPath(args.path, args.frames)
+    if args.edit_interval > 0:
+        addScriptedEdits(path, args.edit_interval, args.voxel_types, args.seed)
+
+    report = runBenchmark(path, args.seed, args.voxel_types, args.transparent_types, args.warmup, not args.no_render, args.memory_budget)
+    report["path"] = args.path
+    report["seed"] = args.seed
+    printReport(report)
+
+    for file_name in (args.output, args.save_baseline):
+        if file_name is not None:
+            with open(file_name, "w") as file:
+                json.dump(report, file, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        regressions = compareToBaseline(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from settings import *
+import json
+
+
+class CameraPath:
+    """
+    A sequence of camera poses, one per simulation tick, along with the voxel edits made along the way.
+    Paths can be recorded in game (RECORD_PATH in settings.py) or scripted, then replayed by benchmark.py.
+
+    Saved paths are JSON:
+        {"frames": [[x, y, z, yaw, pitch, roll], ...], "edits": [[frame, x, y, z, type], ...]}
+    """
+    def __init__(self, frames=None, edits=None):
+        self.frames = frames if frames is not None else []
+        self.edits = edits if edits is not None else []
+
+    def __len__(self):
+        return len(self.frames)
+
+    def record(self, camera):
+        self.frames.append((*camera.position, *camera.rotation))
+
+    def recordEdit(self, position, type):
+        # Edits are stored against the frame they were made on
+        self.edits.append((len(self.frames), *position, type))
+
+    def pose(self, frame):
+        # The (position, rotation) of the camera on a frame
+        x, y, z, yaw, pitch, roll = self.frames[frame]
+        return (x, y, z), (yaw, pitch, roll)
+
+    def editsAt(self, frame):
+        # The (position, type) of every edit made on a frame
+        return [((x, y, z), type) for edit_frame, x, y, z, type in self.edits if edit_frame == frame]
+
+    def save(self, file_name):
+        with open(file_name, "w") as file:
+            json.dump({"frames": [list(frame) for frame in self.frames],
+                       "edits": [list(edit) for edit in self.edits]}, file)
+
+    @classmethod
+    def load(cls, file_name):
+        with open(file_name) as file:
+            data = json.load(file)
+        return cls([tuple(frame) for frame in data["frames"]],
+                   [tuple(edit) for edit in data.get("edits", [])])
+
+
+def orbitPath(frame_count, radius=24, height=-6):
+    # Circle the origin, looking inwards
+    # Keeps a steady number of chunks loaded while the whole mesh is transformed and sorted from every angle
+    path = CameraPath()
+    for i in range(frame_count):
+        angle = 2 * math.pi * i / frame_count
+        # Yaw 0 looks along +z, so facing the centre means looking along -position
+        yaw = math.degrees(math.atan2(-math.sin(angle), -math.cos(angle)))
+        path.frames.append((math.sin(angle) * radius, height, math.cos(angle) * radius, yaw, 20, 0))
+    return path
+
+
+def flyoverPath(frame_count, speed=0.5, height=-4):
+    # Fly in a straight line, crossing chunk boundaries so chunks are constantly loaded and unloaded
+    path = CameraPath()
+    for i in range(frame_count):
+        path.frames.append((0, height, i * speed, 0, 25, 0))
+    return path
+
+
+def spinPath(frame_count, height=-4):
+    # Stand still and turn on the spot - no chunks are loaded, so only rendering is measured
+    path = CameraPath()
+    for i in range(frame_count):
+        path.frames.append((0, height, 0, 360 * i / frame_count, 20, 0))
+    return path
+
+
+SCRIPTED_PATHS = {
+    "orbit": orbitPath,
+    "flyover": flyoverPath,
+    "spin": spinPath,
+}
+
+
+def addScriptedEdits(path, interval, voxel_type_count, seed, spread=8):
+    # Place or remove a voxel near the camera every interval frames, to measure chunk remeshing
+    # A seeded generator is used so the same edits are made on every run
+    random_generator = np.random.default_rng(seed)
+    for frame in range(0, len(path), interval):
+        (x, y, z), rotation = path.pose(frame)
+        offset = random_generator.integers(-spread, spread + 1, size=3)
+        position = (int(x) + int(offset[0]), int(random_generator.integers(-2, 1)), int(z) + int(offset[2]))
+        type = int(random_generator.integers(0, voxel_type_count + 1))
+        path.edits.append((frame, *position, type))
+    return path
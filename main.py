@@ -1,10 +1,30 @@
+import time
+# Recorded before anything else is imported, so the time to first frame includes imports and JIT compilation
+START_TIME = time.perf_counter()
+
 from settings import *
+from profiler import Profiler
+from camera_path import CameraPath
+from storage import createStorage
+from memory import MemoryGovernor
+import hashlib
 
 
 class Camera:
     def __init__(self, starting_position: pg.Vector3, starting_rotation: pg.Vector3):
         self.position = pg.Vector3(starting_position)  #(x, y, z)
         self.rotation = pg.Vector3(starting_rotation)  #(yaw, pitch, roll)
+        # State at the start of the current tick, so rendering can interpolate between ticks
+        self.previous_position = pg.Vector3(self.position)
+        self.previous_rotation = pg.Vector3(self.rotation)
+
+    def storePreviousState(self):
+        self.previous_position = pg.Vector3(self.position)
+        self.previous_rotation = pg.Vector3(self.rotation)
+
+    def interpolate(self, alpha):
+        # A camera part way (0-1) between the previous and current state
+        return Camera(self.previous_position.lerp(self.position, alpha), self.previous_rotation.lerp(self.rotation, alpha))
     
     def move(self, keys, delta):
         # Requirement - U3
@@ -45,11 +65,18 @@ class Camera:
         self.rotation = self.rotation + rotation_vector
         # Clamp the pitch to directly up/down
         self.rotation.y = clamp(self.rotation.y, -90, 90)
+
+    def lookDirection(self):
+        # Unit vector the camera is facing - the same rotation processFace() undoes
+        yaw = math.radians(self.rotation.x)
+        pitch = math.radians(self.rotation.y)
+        return pg.Vector3(math.sin(yaw) * math.cos(pitch), math.sin(pitch), math.cos(yaw) * math.cos(pitch))
     
 
 class Player(Camera):
-    def __init__(self, starting_position, starting_rotation):
+    def __init__(self, starting_position, starting_rotation, world):
         super().__init__(starting_position, starting_rotation)
+        self.world = world  # The world the player edits
         self.voxel_type = 1
 
     def updateVoxelType(self, mouse_wheel_y):
@@ -59,43 +86,61 @@ class Player(Camera):
         self.voxel_type += mouse_wheel_y
 
         # If it goes out of bounds, loop to the other end of list
-        if self.voxel_type > len(world.voxel_types):
+        if self.voxel_type > len(self.world.voxel_types):
             self.voxel_type = 1
         if self.voxel_type < 1:
             # 1 is used because 0 is empty, bound to left click
-            self.voxel_type = len(world.voxel_types) 
+            self.voxel_type = len(self.world.voxel_types) 
     
     def placeVoxels(self):
         # Requirement - U1
         # Requirement - FI3
         
         # Voxel Placing - TODO complete
+        # Returns the last (position, type) edit made, so it can be recorded
+        edit = None
         placing_pos = (int(self.position.x), int(self.position.y), int(self.position.z))
 
         if pg.mouse.get_pressed()[2]:  # Right click
-            world.setVoxel(placing_pos , self.voxel_type)
+            self.world.setVoxel(placing_pos , self.voxel_type)
+            edit = (placing_pos, self.voxel_type)
         if pg.mouse.get_pressed()[0]:  # Left click
-            world.setVoxel(placing_pos, 0)
+            self.world.setVoxel(placing_pos, 0)
+            edit = (placing_pos, 0)
+
+        return edit
 
 
 class World:
-    def __init__(self, name, chunk_size):
+    def __init__(self, name, chunk_size, database, terrain_generator, profiler):
         self.name = name
-        self.chunks = []
+        # Sparse index of loaded chunks - only chunks containing voxels have a Chunk (and voxel array and mesh)
+        # Each Chunk also records which of its bricks (BRICK_SIZE^3 blocks) contain voxels
+        self.chunks = {}  # position -> Chunk
+        self.empty_chunks = set()  # Positions of loaded chunks that are all empty
         self.changed = True  # Flag to reconstruct mesh - set to true if any chunk meshes are changed
+        checkChunkSize(chunk_size)
         self.chunk_size = chunk_size
+        self.load_offsets = loadOffsets()  # Offsets from the player's chunk of every chunk that could be loaded
+        self.load_radius = LOAD_RADIUS  # Lowered by the MemoryGovernor when memory is running out
+        self.last_position = None  # Where the player was last update, to find the direction they're moving
+        self.velocity = np.zeros(3)  # Smoothed movement per update (voxels)
+        self.database = database  # Stores the voxel types
+        self.terrain_generator = terrain_generator  # Generates chunks that haven't been saved yet
+        self.profiler = profiler
 
     def updateVoxelList(self):
-        raw_voxel_list = database.fetchVoxelTypes()
-
-        self.voxel_types = []
-        for raw_voxel in raw_voxel_list:
-            self.voxel_types.append(raw_voxel[1:4])
+        # Rebuilds the lookup tables - called again whenever a voxel type is added
+        # Faces only store their type, so existing meshes stay valid
+        raw_voxel_list = self.database.fetchVoxelTypes()
+        self.voxel_types = VoxelTypes(raw_voxel_list)
 
     def getVoxel(self, position):
         # Get the voxel type at a specific world position
         chunk_position, local_position = self.__worldToLocal(position)
         chunk = self.__getChunk(chunk_position)
+        if chunk is None:
+            return 0
         voxel = chunk.getVoxel(local_position)
         return voxel
 
@@ -103,78 +148,238 @@ class World:
         # Set the voxel type at a specific world position
         chunk_position, local_position = self.__worldToLocal(tuple(position))
         chunk = self.__getChunk(chunk_position)
-        chunk.setVoxel(local_position, type)
+        if chunk is None:
+            if type == 0:
+                return
+            # The first voxel placed in an empty chunk gives it a voxel array
+            chunk = Chunk(chunk_position, np.zeros(CHUNK_VOLUME, dtype=np.uint8), self.chunk_size, self.voxel_types)
+            self.empty_chunks.discard(chunk_position)
+            self.chunks[chunk_position] = chunk
+        with self.profiler.stage("chunk_mesh"):
+            chunk.setVoxel(local_position, type, self.voxel_types)
+        self.profiler.count("chunks_meshed")
         self.changed = True
 
+    def getVoxels(self, positions, load=True):
+        """
+        Get the voxel types at many world positions at once - an (n, 3) array of positions in, an (n,) array of types out
+        Positions are grouped by chunk, so each chunk is looked up once and its voxels gathered in one NumPy index
+        If load is False, voxels in unloaded chunks are returned as empty rather than loading the chunk
+        """
+        types = np.zeros(len(positions), dtype=np.uint8)
+        for chunk_position, indices, local_indices in self.__groupByChunk(positions):
+            if load:
+                chunk = self.__getChunk(chunk_position)
+            else:
+                chunk = self.chunks.get(chunk_position)
+            # Empty chunks have no voxel array, and are already 0
+            if chunk is not None:
+                types[indices] = chunk.voxels[local_indices]
+        return types
+
+    def setVoxels(self, positions, types):
+        # Set the voxel types at many world positions at once
+        # Each chunk that is changed is only remeshed once, however many of its voxels change
+        types = np.broadcast_to(np.asarray(types, dtype=np.uint8), (len(positions),))
+        for chunk_position, indices, local_indices in self.__groupByChunk(positions):
+            chunk = self.__getChunk(chunk_position)
+            if chunk is None:
+                if not types[indices].any():
+                    continue
+                chunk = Chunk(chunk_position, np.zeros(CHUNK_VOLUME, dtype=np.uint8), self.chunk_size, self.voxel_types)
+                self.empty_chunks.discard(chunk_position)
+                self.chunks[chunk_position] = chunk
+            with self.profiler.stage("chunk_mesh"):
+                chunk.setVoxels(local_indices, types[indices], self.voxel_types)
+            self.profiler.count("chunks_meshed")
+            self.changed = True
+
+    def worldToChunkIndices(self, positions):
+        # Convert an (n, 3) array of world positions to an (n, 3) array of chunk positions
+        # and an (n,) array of indices into each chunk's flattened voxels, the same as toFlat()
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        chunk_positions = positions // self.chunk_size
+        local_positions = positions % self.chunk_size
+        local_indices = local_positions[:, 0] + local_positions[:, 1] * self.chunk_size + local_positions[:, 2] * self.chunk_size**2
+        return chunk_positions, local_indices
+
+    def __groupByChunk(self, positions):
+        # Yields (chunk position, indices into positions, local indices) for each chunk the positions are in
+        chunk_positions, local_indices = self.worldToChunkIndices(positions)
+        if len(chunk_positions) == 0:
+            return
+        # Each chunk position is packed into one integer key, 21 bits per axis, as np.unique is much faster on 1d arrays
+        keys = ((chunk_positions + 2**20) << np.array([42, 21, 0])).sum(axis=1)
+        unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        unique_chunks = ((unique_keys[:, np.newaxis] >> np.array([42, 21, 0])) & (2**21 - 1)) - 2**20
+
+        # Sorting by chunk puts each chunk's positions next to each other
+        order = np.argsort(inverse, kind="stable")
+        ends = np.cumsum(counts)
+        starts = ends - counts
+        for chunk_position, start, end in zip(unique_chunks.tolist(), starts, ends):
+            indices = order[start:end]
+            yield tuple(chunk_position), indices, local_indices[indices]
+
     def update(self, camera):
         # Update loaded chunks based on player position
-        self.__updateRenderedChunks(camera.position)  # Requirement - FP7
+        self.__updateRenderedChunks(camera)  # Requirement - FP7
         # Reconstruct mesh if needed
         if self.changed:
-            self.__constructMesh()  # Requirement - FP8
+            with self.profiler.stage("world_mesh"):
+                self.__constructMesh()  # Requirement - FP8
         self.changed = False
 
-    def __updateRenderedChunks(self, player_pos):
+    def __updateRenderedChunks(self, camera):
         # Requirement - U5
         # Requirement - FP7
-
-        chunks_to_load = []
-        # Builds a list of chunks that need to be loaded
-        for i in range(RENDER_DISTANCE ** 3):
-            # Generate an [x, y, z] index in a cube pattern
-            x = i % RENDER_DISTANCE
-            y = (i // RENDER_DISTANCE) % RENDER_DISTANCE
-            z = i // RENDER_DISTANCE ** 2
-
-            # Shift so chunks generate centred on the player
-            x = int((player_pos.x//self.chunk_size) + x) - RENDER_DISTANCE//2
-            y = int((player_pos.y//self.chunk_size) + y) - RENDER_DISTANCE//2
-            z = int((player_pos.z//self.chunk_size) + z) - RENDER_DISTANCE//2
-
-            loaded_chunk_position = (x, y, z)
-            chunks_to_load.append(loaded_chunk_position)
-
-        # Unload uneeded chunkss
-        for chunk in self.chunks:
-            if chunk.position not in chunks_to_load:
-                # If chunk is not inside the player's render distance, we unload it
-                self.changed = True
-                self.unloadChunk(chunk.position)
-
-        # Load needed chunks that are currently unloaded
-        for chunk_position in chunks_to_load:
-            if self.__getChunkIndex(list(chunk_position)) == None:
-                # If the chunk is not loaded, we load it
+        position = np.array(camera.position, dtype=np.float64)
+
+        # The load shape reaches further in the direction the player is looking and moving
+        view_direction = np.array(camera.lookDirection(), dtype=np.float64)
+        if self.last_position is not None:
+            self.velocity = MOVEMENT_SMOOTHING * self.velocity + (1 - MOVEMENT_SMOOTHING) * (position - self.last_position)
+        self.last_position = position
+        # Scaled so moving at PLAYER_SPEED (one update per tick) stretches it by the full MOVEMENT_LOOKAHEAD
+        movement_direction = self.velocity / (PLAYER_SPEED / TICK_RATE)
+        speed = np.linalg.norm(movement_direction)
+        if speed > 1:
+            movement_direction /= speed
+
+        # Unload chunks outside the unload shape
+        # It isn't stretched, and reaches past the furthest the load shape can, so chunks aren't unloaded and reloaded as the player turns or moves
+        loaded_positions = self.loadedPositions()
+        if loaded_positions:
+            unload_radius = self.load_radius + VIEW_LOOKAHEAD + MOVEMENT_LOOKAHEAD + UNLOAD_MARGIN
+            no_stretch = np.zeros(3)
+            keep = self.__inLoadShape(np.array(loaded_positions), position, unload_radius, VERTICAL_LOAD_RADIUS + UNLOAD_MARGIN, no_stretch, no_stretch)
+            for chunk_position, kept in zip(loaded_positions, keep):
+                if not kept:
+                    self.changed = True
+                    self.unloadChunk(chunk_position)
+
+        # Load chunks inside the load shape that are currently unloaded
+        player_chunk = np.floor((position + 0.5) / self.chunk_size).astype(np.int64)
+        candidates = player_chunk + self.load_offsets
+        load = self.__inLoadShape(candidates, position, self.load_radius, VERTICAL_LOAD_RADIUS, view_direction, movement_direction)
+        for chunk_position in candidates[load].tolist():
+            chunk_position = tuple(chunk_position)
+            if not self.isLoaded(chunk_position):
                 self.changed = True
                 self.loadChunk(chunk_position)
 
+    def __inLoadShape(self, chunk_positions, position, radius, vertical_radius, view_direction, movement_direction):
+        # Whether each chunk is inside the LOAD_SHAPE of the given radii around position
+        # Distances are to the nearest point of each chunk, so a chunk is loaded as soon as any of it is in range
+        size = self.chunk_size
+        # Voxels are centred on integer positions, so a chunk's box starts half a voxel before its first voxel
+        lower = chunk_positions * size - 0.5
+        offset = np.clip(position, lower, lower + size) - position
+
+        # Stretch the shape towards chunks in front of the player
+        to_centre = lower + size / 2 - position
+        to_centre /= np.maximum(np.linalg.norm(to_centre, axis=1), 1e-9)[:, np.newaxis]
+        stretch = (VIEW_LOOKAHEAD * np.maximum(to_centre @ view_direction, 0) +
+                   MOVEMENT_LOOKAHEAD * np.maximum(to_centre @ movement_direction, 0))
+        reach = (radius + stretch) * size
+
+        if LOAD_SHAPE == "sphere":
+            return np.linalg.norm(offset, axis=1) <= reach
+
+        vertical = np.abs(offset[:, 1]) <= vertical_radius * size
+        if LOAD_SHAPE == "cylinder":
+            return (np.hypot(offset[:, 0], offset[:, 2]) <= reach) & vertical
+        if LOAD_SHAPE == "cube":
+            return (np.maximum(np.abs(offset[:, 0]), np.abs(offset[:, 2])) <= reach) & vertical
+        raise ValueError(f"Unknown load shape {LOAD_SHAPE}")
+
     def __constructMesh(self):
         # Requirement - FP8
 
-        # Build the world mesh from existing chunk meshes
-        mesh = []
-        for chunk in self.chunks:
-            mesh += chunk.mesh
-        self.mesh = np.array(mesh, dtype=Face)
+        # Build the world meshes from existing chunk meshes
+        # Empty chunks have no mesh, so only occupied chunks are visited
+        chunks = list(self.chunks.values())
+        self.opaque_mesh = Mesh.concatenate([chunk.opaque_mesh for chunk in chunks])
+        self.transparent_mesh = Mesh.concatenate([chunk.transparent_mesh for chunk in chunks])
+
+        # Each chunk's faces are a contiguous range of the world meshes, so the renderer can cull whole chunks
+        self.mesh_chunk_positions = np.array([chunk.position for chunk in chunks], dtype=np.int32).reshape(-1, 3)
+        self.opaque_ranges = meshRanges([chunk.opaque_mesh for chunk in chunks])
+        self.transparent_ranges = meshRanges([chunk.transparent_mesh for chunk in chunks])
+
+        # Chunk meshes become views of the world meshes, so each face is only stored once
+        # A chunk gets its own arrays again when it is remeshed
+        for chunk, (opaque_start, opaque_end), (transparent_start, transparent_end) in zip(chunks, self.opaque_ranges, self.transparent_ranges):
+            chunk.opaque_mesh = self.opaque_mesh.select(slice(opaque_start, opaque_end))
+            chunk.transparent_mesh = self.transparent_mesh.select(slice(transparent_start, transparent_end))
+
+    def isLoaded(self, position):
+        return position in self.chunks or position in self.empty_chunks
+
+    def loadedPositions(self):
+        # A list of every loaded chunk position, empty or not
+        return list(self.chunks) + list(self.empty_chunks)
     
     def __getChunk(self, position:tuple[int, int, int]):
-        # If the chunk doesn't exist, load it
-        chunk_index = self.__getChunkIndex(position)
-        if chunk_index == None:
+        # If the chunk isn't loaded, load it
+        # Returns None for empty chunks
+        position = tuple(position)
+        if not self.isLoaded(position):
             self.loadChunk(position)
-            # loadChunk appends the chunk to the end of self.chunks
-            # So it will be the last item in the list
-            return self.chunks[-1]
 
         # Return the requested chunk
-        return self.chunks[chunk_index]
-
-    def __getChunkIndex(self, position):
-        # From a chunk position, get the 
-        # Index of the chunk in the array of loaded chunks
-        for index, chunk in enumerate(self.chunks):
-            if chunk.position == tuple(position): 
-                return index
+        return self.chunks.get(position)
+
+    def raycast(self, origin, direction, max_distance=RAYCAST_DISTANCE):
+        """
+        Find the first voxel along a ray, returning (position of the voxel, position of the empty voxel in front of it),
+        or None if nothing is hit within max_distance
+
+        The ray steps through the sparse index: empty or unloaded chunks and empty bricks are crossed in a single step,
+        and only bricks that contain voxels are stepped through voxel by voxel
+        """
+        # Voxels are centred on integer positions, so shifting by 0.5 makes the voxel containing a point floor(point)
+        origin = np.array(origin, dtype=np.float64) + 0.5
+        direction = np.array(direction, dtype=np.float64)
+        direction /= np.linalg.norm(direction)
+        # Distance along the ray to cross one unit along each axis
+        with np.errstate(divide="ignore"):
+            inverse_direction = 1 / direction
+
+        epsilon = 1e-6  # Steps just past a boundary, into the next block
+        distance = 0.0
+        while distance <= max_distance:
+            cell = np.floor(origin + direction * distance).astype(np.int64)
+            chunk_position = tuple(int(axis) for axis in cell // self.chunk_size)
+            chunk = self.chunks.get(chunk_position)
+
+            if chunk is None:
+                # Empty or unloaded chunk - skip all of it
+                block_size = self.chunk_size
+                block_origin = cell - cell % self.chunk_size
+            else:
+                local_position = cell % self.chunk_size
+                brick = local_position // BRICK_SIZE
+                if not chunk.bricks[brick[2], brick[1], brick[0]]:
+                    # Empty brick - skip all of it
+                    block_size = BRICK_SIZE
+                    block_origin = cell - local_position % BRICK_SIZE
+                else:
+                    voxel = chunk.getVoxel(tuple(local_position))
+                    if voxel != 0:
+                        # The voxel just before the one hit is the one the ray entered from
+                        previous_cell = np.floor(origin + direction * (distance - 2 * epsilon)).astype(np.int64)
+                        return tuple(int(axis) for axis in cell), tuple(int(axis) for axis in previous_cell)
+                    block_size = 1
+                    block_origin = cell
+
+            # Move to where the ray leaves the block
+            exit_planes = np.where(direction > 0, block_origin + block_size, block_origin)
+            with np.errstate(invalid="ignore"):
+                exits = (exit_planes - origin) * inverse_direction
+            exits[direction == 0] = np.inf
+            distance = exits.min() + epsilon
+
         return None
 
     def __worldToLocal(self, position):
@@ -188,44 +393,107 @@ class World:
 
     def loadChunk(self, position):
         # Requirement - U2
-        try:
-            # Load chunk data from file
-            file_name = self.__getFilePath(str(tuple(position)))+".npy"
-            voxels = np.load(file_name)
-        except OSError:
-            # If the file does not exist, generate a new chunk
-            voxels = terrain_generator.generateChunk(position)
+        position = tuple(position)
+        with self.profiler.stage("load"):
+            file_name = self.__getFilePath(str(tuple(position)))
+            try:
+                # Load chunk data from file
+                voxels = np.load(file_name+".npy")
+                # Use the saved mesh too, if there is one
+                meshes = Chunk.loadMeshes(file_name)
+            except OSError:
+                # If the file does not exist, generate a new chunk
+                voxels = self.terrain_generator.generateChunk(position, len(self.voxel_types))
+                meshes = None
+
+        self.profiler.count("chunks_loaded")
+
+        # Empty chunks are only recorded in the index - they have nothing to mesh or save
+        # If the chunk was generated, generating it again gives the same empty chunk
+        if not voxels.any():
+            self.empty_chunks.add(position)
+            return
+
+        # The chunk builds its mesh when it is created, unless it was loaded
+        with self.profiler.stage("chunk_mesh"):
+            self.chunks[position] = Chunk(position, voxels, self.chunk_size, self.voxel_types, meshes)
 
-        self.chunks.append(Chunk(position, voxels, self.chunk_size))
+        if meshes is None:
+            self.profiler.count("chunks_meshed")
 
     def unloadChunk(self, position):
         # Requirement - U2
         # Unload a chunk, saving it to file
-        chunk = self.__getChunk(position)
+        position = tuple(position)
+        if position in self.empty_chunks:
+            self.empty_chunks.remove(position)
+            return
 
-        # If the folder to save in doesn't exist,
-        if not os.path.exists(self.name):
-            # Create it
-            os.makedirs(self.name)
+        chunk = self.chunks.pop(position)
 
-        file_name = self.__getFilePath(str(tuple(position)))
-        np.save(file_name, chunk.voxels)
+        # Chunks that haven't changed since they were loaded are already saved
+        if chunk.unsaved:
+            with self.profiler.stage("unload"):
+                # If the folder to save in doesn't exist,
+                if not os.path.exists(self.name):
+                    # Create it
+                    os.makedirs(self.name)
 
-        self.chunks.remove(chunk)
+                file_name = self.__getFilePath(str(tuple(position)))
+                chunk.save(file_name)
 
     def __getFilePath(self, file_name):
         return self.name + "/" + file_name
 
 
+class VoxelTypes:
+    """
+    Lookup tables of voxel type properties, loaded once from the database.
+    Each table is a NumPy array indexed directly by type, so meshing and rendering can look types up without Python tuples.
+    Row 0 is the empty voxel.
+    """
+    def __init__(self, raw_voxel_list):
+        type_count = len(raw_voxel_list) + 1
+
+        self.colours = np.zeros((type_count, 3), dtype=np.uint8)  # (r, g, b)
+        self.flags = np.zeros(type_count, dtype=np.uint8)  # Bit flags, e.g. TRANSPARENT_FLAG
+        # Empty voxels can be seen through
+        self.flags[0] = TRANSPARENT_FLAG
+
+        # Rows are (voxel_id, red, green, blue, transparent)
+        for type, raw_voxel in enumerate(raw_voxel_list, start=1):
+            self.colours[type] = raw_voxel[1:4]
+            if raw_voxel[4]:
+                self.flags[type] |= TRANSPARENT_FLAG
+
+        self.transparent = (self.flags & TRANSPARENT_FLAG) != 0
+
+    def __len__(self):
+        # The number of placeable types, not including empty
+        return len(self.colours) - 1
+
+
 class Chunk:
-    def __init__(self, position, voxels, chunk_size):
+    def __init__(self, position, voxels, chunk_size, voxel_types, meshes=None):
         # Index of the chunk in 3d space - Tuple
         self.position = tuple(position)
+        checkChunkSize(chunk_size)
         self.chunk_size = chunk_size
         # Types of the voxels contained in the chunk - A flattened 1d numpy array of integers
         # It is stored this way for efficiency - both time and space 
         self.voxels = voxels
-        self.constructMesh()
+        # Which bricks (BRICK_SIZE^3 blocks of voxels) contain any voxels - a (z, y, x) array of bools
+        # Meshing and raycasts skip the empty ones
+        self.updateBricks()
+
+        # meshes is the (opaque, transparent) meshes if they were saved with the chunk
+        if meshes is None:
+            self.constructMesh(voxel_types)
+        else:
+            self.opaque_mesh, self.transparent_mesh = meshes
+
+        # Flag to save the chunk when it is unloaded - set to true if the chunk or its mesh aren't on disk
+        self.unsaved = meshes is None
     
     def getVoxel(self, position):
         # Fetch the voxel data at an (x, y, z) position in the chunk
@@ -241,7 +509,7 @@ class Chunk:
 
         return 0  # If position is outside chunk, assume it's empty to prevent holes in the terrain
     
-    def setVoxel(self, position, type):
+    def setVoxel(self, position, type, voxel_types):
         # Set the voxel data at an (x, y, z) position in the chunk
         # Then rebuild the chunk mesh
 
@@ -251,93 +519,267 @@ class Chunk:
             0 <= y <= self.chunk_size - 1 or
             0 <= z <= self.chunk_size - 1):
                 index = toFlat(position)
-                self.voxels[index] = type
-                self.constructMesh()
-
-    def constructMesh(self):
-        # This constructs the chunk mesh
-        # It takes the form of a list, with each element being a Face object
-        # The face_index determines which side of the voxel the face belongs to, with the lookup table stored in settings.py
-
-        chunk_offset = pg.Vector3(self.position)*self.chunk_size
-
-        self.mesh = []
-        filtered_voxels = np.argwhere(self.voxels != 0)
-        for voxel_index in filtered_voxels:
-            voxel_pos = pg.Vector3(to3d(voxel_index))
-
-            for face_index, face_normal in enumerate(FACE_NORMALS):
-                # Interior Face Culling
-                check_pos = voxel_pos + face_normal
-                neighbour_type = self.getVoxel(check_pos)
-                if neighbour_type == 0:
-                    
-                    voxel_world_pos = tuple((chunk_offset + pg.Vector3(voxel_pos)))
+                self.setVoxels(index, type, voxel_types)
+
+    def setVoxels(self, indices, types, voxel_types):
+        # Set the voxels at indices of the flattened voxel array, then rebuild the chunk mesh once
+        self.voxels[indices] = types
+        self.updateBricks()
+        self.constructMesh(voxel_types)
+        self.unsaved = True
+
+    def updateBricks(self):
+        bricks_per_side = self.chunk_size // BRICK_SIZE
+        bricks = self.voxels.reshape(bricks_per_side, BRICK_SIZE, bricks_per_side, BRICK_SIZE, bricks_per_side, BRICK_SIZE)
+        self.bricks = bricks.any(axis=(1, 3, 5))
+
+    def save(self, file_name):
+        # Save the voxels to file_name.npy, and the meshes built from them to file_name.mesh.npz
+        # Each file is written under a temporary name then renamed, so an interrupted save never leaves half a file
+        # The old mesh is deleted first, so a saved mesh never belongs to different voxels
+        mesh_file_name = file_name + ".mesh.npz"
+        if os.path.exists(mesh_file_name):
+            os.remove(mesh_file_name)
+
+        with open(file_name + ".npy.tmp", "wb") as file:
+            np.save(file, self.voxels)
+        os.replace(file_name + ".npy.tmp", file_name + ".npy")
+
+        with open(mesh_file_name + ".tmp", "wb") as file:
+            np.savez(file, format=np.array(MESH_FORMAT_STAMP), **self.opaque_mesh.toArrays("opaque_"), **self.transparent_mesh.toArrays("transparent_"))
+        os.replace(mesh_file_name + ".tmp", mesh_file_name)
+
+        self.unsaved = False
+
+    @staticmethod
+    def loadMeshes(file_name):
+        # Load the (opaque, transparent) meshes saved with a chunk, or None if there aren't any
+        # Meshes saved in another format (a different MESH_FORMAT_STAMP, or none at all) are rebuilt instead
+        try:
+            with np.load(file_name + ".mesh.npz") as arrays:
+                if str(arrays["format"]) != MESH_FORMAT_STAMP:
+                    return None
+                return Mesh.fromArrays(arrays, "opaque_"), Mesh.fromArrays(arrays, "transparent_")
+        except (OSError, KeyError):
+            return None
+
+    def constructMesh(self, voxel_types):
+        # This constructs the chunk meshes - one for opaque voxels and one for transparent voxels
+        # Faces of transparent voxels are kept separate, so only they need a full depth sort
+        # Every face in the chunk is found at once with NumPy, rather than voxel by voxel
+        # Ambient occlusion is found here and packed into each face, so it costs nothing per frame
+
+        size = self.chunk_size
+
+        opaque_meshes = []
+        transparent_meshes = []
+        occupied_bricks = np.nonzero(self.bricks)
+        if len(occupied_bricks[0]) == 0:
+            self.opaque_mesh = Mesh.empty()
+            self.transparent_mesh = Mesh.empty()
+            return
+
+        # Only the box around the occupied bricks is searched for faces - (z, y, x) voxel bounds
+        low = np.min(occupied_bricks, axis=1) * BRICK_SIZE
+        high = (np.max(occupied_bricks, axis=1) + 1) * BRICK_SIZE
+        (low_z, low_y, low_x), (high_z, high_y, high_x) = low, high
+
+        # A (z, y, x) grid of voxel types, padded with empty voxels so that neighbours outside the chunk are empty
+        grid = np.pad(self.voxels.reshape(size, size, size), 1)
+        types = grid[1+low_z:1+high_z, 1+low_y:1+high_y, 1+low_x:1+high_x]
+        see_through = voxel_types.transparent[grid]
+        blocks_light = ~see_through
+
+        for face_index, face_normal in enumerate(FACE_NORMALS):
+            nx, ny, nz = face_normal
+
+            # Interior Face Culling
+            # Faces next to transparent voxels can be seen, unless both voxels are the same type (e.g. inside water)
+            neighbour_slice = (slice(1+low_z+nz, 1+high_z+nz), slice(1+low_y+ny, 1+high_y+ny), slice(1+low_x+nx, 1+high_x+nx))
+            neighbours = grid[neighbour_slice]
+            neighbour_see_through = see_through[neighbour_slice]
+            visible = (types != 0) & neighbour_see_through & (neighbours != types)
+
+            z, y, x = np.nonzero(visible)
+            if len(x) == 0:
+                continue
+            face_types = types[z, y, x]
+            # Back to positions in the chunk
+            z, y, x = z + low_z, y + low_y, x + low_x
+
+            occlusion = self.__vertexOcclusion(blocks_light, x, y, z, face_index)
+
+            faces = packFaces(x, y, z, face_index, occlusion, face_types)
+            mesh = Mesh(faces, faceColours(faces, voxel_types))
+
+            transparent = voxel_types.transparent[face_types]
+            opaque_meshes.append(mesh.select(~transparent))
+            transparent_meshes.append(mesh.select(transparent))
 
-                    voxel_type = self.getVoxel(voxel_pos)
+        self.opaque_mesh = Mesh.concatenate(opaque_meshes)
+        self.transparent_mesh = Mesh.concatenate(transparent_meshes)
 
-                    self.mesh.append(Face(voxel_world_pos, face_index, voxel_type))
+    def __vertexOcclusion(self, blocks_light, x, y, z, face_index):
+        # Ambient occlusion level (0-3, 3 being unoccluded) of each corner of each face
+        # Each corner is occluded by the two voxels beside it and the one diagonal to it, in the layer the face points into
+        # If both side voxels block light, the corner is fully occluded whatever the diagonal is
+        face_normal = np.array(FACE_NORMALS[face_index])
+        tangent_axes = np.nonzero(face_normal == 0)[0]
+
+        occlusion = np.empty((len(x), 4), dtype=np.uint8)
+        for corner, vertex_index in enumerate(FACES[face_index]):
+            # Which side of the voxel the corner is on, along each axis
+            direction = np.sign(VERTICES[vertex_index]).astype(np.int64)
+
+            first_side = face_normal.copy()
+            first_side[tangent_axes[0]] = direction[tangent_axes[0]]
+            second_side = face_normal.copy()
+            second_side[tangent_axes[1]] = direction[tangent_axes[1]]
+            diagonal = first_side + second_side - face_normal
+
+            # +1 because of the padding around the grid
+            def blocked(offset):
+                return blocks_light[z + 1 + offset[2], y + 1 + offset[1], x + 1 + offset[0]]
+
+            first = blocked(first_side)
+            second = blocked(second_side)
+            occluders = first.astype(np.uint8) + second + blocked(diagonal)
+            occlusion[:, corner] = np.where(first & second, 0, 3 - occluders)
+
+        return occlusion
 
 
 class TerrainGenerator:
     def __init__(self, seed):
         self.seed = seed
         
-    def sample(self, position):
-        if position[1] == 0:
-            voxel_type = (math.sqrt(((position[0]*CHUNK_SIZE)**2)+
-                            ((position[2]*CHUNK_SIZE)**2))//2
-                ) % (len(world.voxel_types)) + 1
-            return voxel_type
-        else:
-            return 0
+    def sample(self, position, voxel_type_count):
+        # position can be a single (x, y, z), or a tuple of x, y and z arrays to sample many voxels at once
+        x, y, z = (np.asarray(axis) for axis in position)
+        voxel_type = (np.sqrt(((x*CHUNK_SIZE)**2)+
+                        ((z*CHUNK_SIZE)**2))//2
+            ) % (voxel_type_count) + 1
+        return np.where(y == 0, voxel_type, 0)
    
-    def generateChunk(self, position):
-        voxels = np.zeros(CHUNK_VOLUME, dtype=np.uint8)  # Int8 is used to decrease memory usage - much smaller than float
-        for x in range(CHUNK_SIZE):
-            for y in range(CHUNK_SIZE):
-                    for z in range(CHUNK_SIZE):
-                        world_x = x + (position[0]*CHUNK_SIZE)
-                        world_y = y + (position[1]*CHUNK_SIZE)
-                        world_z = z + (position[2]*CHUNK_SIZE)
+    def generateChunk(self, position, voxel_type_count):
+        # Every voxel in the chunk is sampled at once, rather than one at a time in Python
+        # np.indices returns (z, y, x) so that the flattened order matches toFlat()
+        z, y, x = np.indices((CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)).reshape(3, CHUNK_VOLUME)
+        world_position = (
+            x + (position[0]*CHUNK_SIZE),
+            y + (position[1]*CHUNK_SIZE),
+            z + (position[2]*CHUNK_SIZE),
+        )
+
+        voxels = self.sample(world_position, voxel_type_count).astype(np.uint8)  # Int8 is used to decrease memory usage - much smaller than float
+        return voxels
 
-                        voxel_type = self.sample((world_x, world_y, world_z))
 
-                        index = toFlat((x, y, z))
+def loadOffsets():
+    # Every chunk offset from the player's chunk that the load shape could reach, as an (n, 3) array
+    horizontal = math.ceil(LOAD_RADIUS + VIEW_LOOKAHEAD + MOVEMENT_LOOKAHEAD) + 1
+    vertical = horizontal if LOAD_SHAPE == "sphere" else math.ceil(VERTICAL_LOAD_RADIUS) + 1
+    x, y, z = np.meshgrid(np.arange(-horizontal, horizontal + 1),
+                          np.arange(-vertical, vertical + 1),
+                          np.arange(-horizontal, horizontal + 1), indexing="ij")
+    return np.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
 
-                        voxels[index] = np.int16(voxel_type)
-        return voxels
 
+def checkChunkSize(chunk_size):
+    # Positions in a chunk are packed into PACKED_POSITION_BITS each, so larger chunks would overflow into the other fields
+    if chunk_size > 2**PACKED_POSITION_BITS:
+        raise ValueError(f"Chunk size {chunk_size} is too large for packed faces - it must be at most {2**PACKED_POSITION_BITS}")
 
-class Face:
-    def __init__(self, position, index, type):
-        """
-        The colour/type is technically uneeded, as world.getVoxel(voxel_world_pos) can be called to get the type
-        However, it gives a massive performance boost due to preventing redundant calculations
-        """
-        self.position = position  # (x,y,z) of the origin of the face
-        self.normal = FACE_NORMALS[index]  # Index of the face - Indexes into FACE_NORMALS
-        self.__index = index
 
-        self.colour = world.voxel_types[type - 1]
+def packFaces(x, y, z, face_index, occlusion, types):
+    # Pack faces into the uint32 format described in settings.py
+    # x, y and z are positions in the chunk, occlusion is (n, 4) levels from 0 to 3
+    faces = (x.astype(np.uint32) |
+             (y.astype(np.uint32) << PACKED_POSITION_BITS) |
+             (z.astype(np.uint32) << 2 * PACKED_POSITION_BITS) |
+             (np.uint32(face_index) << PACKED_FACE_INDEX_SHIFT) |
+             (types.astype(np.uint32) << PACKED_TYPE_SHIFT))
+    for corner in range(4):
+        faces |= occlusion[:, corner].astype(np.uint32) << (PACKED_OCCLUSION_SHIFT + 2 * corner)
+    return faces
+
+
+def faceColours(faces, voxel_types):
+    # The colour each packed face is drawn with, found when the chunk is meshed so it costs nothing per frame:
+    # the base colour of its type, darkened by the direction the face points and the average occlusion of its corners
+    # pygame fills polygons with one colour, so the corners are averaged rather than interpolated
+    face_indices = (faces >> PACKED_FACE_INDEX_SHIFT) & 7
+    occlusion = (faces[:, np.newaxis] >> (PACKED_OCCLUSION_SHIFT + 2 * np.arange(4, dtype=np.uint32))) & 3
+    types = (faces >> PACKED_TYPE_SHIFT) & 255
+
+    brightness = FACE_SHADING[face_indices] * OCCLUSION_BRIGHTNESS[occlusion].mean(axis=1)
+    return (voxel_types.colours[types] * brightness[:, np.newaxis]).astype(np.uint8)
+
+
+def meshRanges(meshes):
+    # The (start, end) of each mesh's faces once they are concatenated
+    ends = np.cumsum([len(mesh) for mesh in meshes], dtype=np.int64)
+    starts = ends - np.array([len(mesh) for mesh in meshes], dtype=np.int64)
+    return np.stack((starts, ends), axis=1).reshape(-1, 2)
+
 
-        self.mesh = self.__generateMesh()
+# Names of the arrays that make up a Mesh, in the order Mesh() takes them
+MESH_ARRAYS = ("faces", "colours")
 
-    def __generateMesh(self):
-        vertex_indices = FACES[self.__index]
-        mesh = np.empty((4, 3), dtype=np.float32)
-        for i, vertex_index in enumerate(vertex_indices):
-            vertex = VERTICES[vertex_index]
 
-            translated_vertex = np.array((
-                vertex[0] + self.position[0],
-                vertex[1] + self.position[1],
-                vertex[2] + self.position[2],
-            ), dtype=np.float32)
+def meshFormatStamp():
+    # A hash of everything a saved mesh's arrays depend on - the packed layout, the face lookup tables and the lighting baked into the colours
+    # Saved meshes with a different stamp are rebuilt, rather than decoded with the wrong layout or drawn with stale colours
+    stamp = hashlib.sha1(repr((MESH_ARRAYS, PACKED_POSITION_BITS, PACKED_FACE_INDEX_SHIFT, PACKED_OCCLUSION_SHIFT, PACKED_TYPE_SHIFT)).encode())
+    for table in (FACE_VERTICES, FACE_NORMALS_ARRAY, FACE_SHADING, OCCLUSION_BRIGHTNESS):
+        stamp.update(table.tobytes())
+    return stamp.hexdigest()
 
-            mesh[i] = translated_vertex
 
-        return mesh
+MESH_FORMAT_STAMP = meshFormatStamp()
+
+
+class Mesh:
+    """
+    A mesh stored as NumPy arrays, with one row per face.
+    Each face is packed into one uint32 (see settings.py) holding its position in its chunk, face index, ambient occlusion and type.
+    Positions are relative to the chunk, so the renderer expands faces using the origin of the chunk they belong to.
+    """
+    def __init__(self, faces, colours):
+        self.faces = faces  # (n,) uint32 - Packed faces
+        self.colours = colours  # (n, 3) uint8 - Colour with shading and ambient occlusion baked in
+
+    def __len__(self):
+        return len(self.faces)
+
+    def nbytes(self, owned_only=False):
+        # Bytes used by the mesh's arrays
+        # If owned_only, arrays that are views of another mesh's arrays aren't counted, so shared memory is only counted once
+        arrays = (getattr(self, name) for name in MESH_ARRAYS)
+        return sum(array.nbytes for array in arrays if not owned_only or array.base is None)
+
+    def toArrays(self, prefix):
+        # The arrays of the mesh by name, for saving with np.savez
+        return {prefix + name: getattr(self, name) for name in MESH_ARRAYS}
+
+    @staticmethod
+    def fromArrays(arrays, prefix):
+        return Mesh(*(arrays[prefix + name] for name in MESH_ARRAYS))
+
+    def select(self, selection):
+        # A new mesh containing only the selected faces (a boolean mask, indices or a slice)
+        return Mesh(*(getattr(self, name)[selection] for name in MESH_ARRAYS))
+
+    @staticmethod
+    def empty():
+        return Mesh(np.empty(0, dtype=np.uint32), np.empty((0, 3), dtype=np.uint8))
+
+    @staticmethod
+    def concatenate(meshes):
+        meshes = [mesh for mesh in meshes if len(mesh) > 0]
+        if len(meshes) == 0:
+            return Mesh.empty()
+        return Mesh(*(np.concatenate([getattr(mesh, name) for mesh in meshes]) for name in MESH_ARRAYS))
 
 
 class Renderer:
@@ -358,42 +800,96 @@ class Renderer:
         - Crosshair
         - FPS
         - Held voxel indicator
+        - Profiler overlay (if toggled on)
     """
-    def __init__(self, surface, sky_colour):
+    def __init__(self, surface, sky_colour, font, profiler):
         self.surface = surface  # The surface the renderer will draw on
         self.sky_colour = sky_colour  # The background colour
+        self.font = font  # The font UI text is drawn with
+        self.profiler = profiler  # Records the time taken by each stage of rendering
+        self.wireframe = WIREFRAME  # Toggled in game
+        self.buffer_bytes = 0  # Estimated memory used by the last frame's processed faces
     
-    def render(self, mesh):
+    def render(self, world, camera, held_type, fps):
         self.surface.fill(SKY_COLOR)
 
-        self.renderMesh(mesh)
+        # Chunks outside the view frustum are culled as a whole, so none of their faces are processed
+        with self.profiler.stage("process"):
+            visible_chunks = cullChunks(world.mesh_chunk_positions, world.chunk_size, tuple(camera.position), tuple(camera.rotation))
+            # World position of the first voxel of each chunk, which the packed face positions are relative to
+            origins = world.mesh_chunk_positions[visible_chunks].astype(np.int64) * world.chunk_size
+
+        self.renderMesh(world.opaque_mesh, world.transparent_mesh, camera, world.voxel_types,
+                        world.opaque_ranges[visible_chunks], world.transparent_ranges[visible_chunks], origins)
 
-        self.renderUI()
+        with self.profiler.stage("ui"):
+            self.renderUI(world.voxel_types.colours[held_type], fps)
 
-    def renderMesh(self, mesh):
+    def renderMesh(self, opaque_mesh, transparent_mesh, camera, voxel_types, opaque_ranges, transparent_ranges, origins):
         """
-        Process the mesh, then draw it on the screen
+        Process the meshes, then draw them on the screen
+        Only the faces in the (start, end) ranges of each mesh are processed, one range per chunk, with origins the chunks' positions
+
+        Faces are drawn back to front, ordered by the Manhattan distance from the camera's voxel to the face's voxel.
+        A voxel can only be hidden by voxels with a smaller distance, so this is a correct painter's order for a voxel grid,
+        and since the distances are small integers, sorting the opaque faces is a cheap stable integer sort.
+        Only the (usually small) set of transparent faces gets a full sort, then they are merged in
+        so each one is drawn over everything behind it.
         """
-        if len(mesh) == 0:
+        faces_in = len(opaque_mesh) + len(transparent_mesh)
+        self.buffer_bytes = 0
+        if faces_in == 0:
             return
         
-        processed_mesh = processMesh(mesh, tuple(player.position), tuple(player.rotation))
-
-        if len(processed_mesh) == 0:
+        camera_position = tuple(camera.position)
+        camera_rotation = tuple(camera.rotation)
+        with self.profiler.stage("process"):
+            processed_opaque = processMesh(opaque_mesh, opaque_ranges, origins, camera_position, camera_rotation)
+            processed_transparent = processMesh(transparent_mesh, transparent_ranges, origins, camera_position, camera_rotation)
+
+        # Each is a tuple of arrays - (points, colours, depths, distances)
+        opaque_count = len(processed_opaque[0])
+        transparent_count = len(processed_transparent[0])
+        faces_processed = opaque_count + transparent_count
+        self.buffer_bytes = sum(array.nbytes for array in processed_opaque + processed_transparent)
+        self.profiler.count("faces_in", faces_in)
+        self.profiler.count("faces_culled", faces_in - faces_processed)
+        self.profiler.count("faces_transparent", transparent_count)
+
+        if faces_processed == 0:
             return
         
-        if INSERTION_SORT:
-            sorted_mesh = self.__sortFaces(processed_mesh)
-        else:
-            sorted_mesh = sorted(processed_mesh, key=lambda x: x[2])[::-1]
-
-        for face in sorted_mesh:
-            # Requirement - FO1
-            pg.draw.polygon(self.surface, face[1], face[0], width=WIREFRAME)
-            if OUTLINE:
-                gfxdraw.aapolygon(self.surface, face[0], (0, 0, 0))
-
-    def renderUI(self):
+        with self.profiler.stage("sort"):
+            opaque_order = self.__sortOpaqueFaces(processed_opaque[3])
+            if INSERTION_SORT:
+                transparent_order = self.__sortFaces(processed_transparent[2], processed_transparent[3])
+            else:
+                # Reverse order of distance, then depth - the keys are negated rather than the result reversed, so ties keep their order
+                transparent_order = np.lexsort((-processed_transparent[2], -processed_transparent[3]))
+            order = self.__mergeFaces(processed_opaque[3][opaque_order], processed_transparent[3][transparent_order])
+
+            # The faces of both meshes in one set of arrays, in the order they are drawn
+            # Transparent faces come after the opaque faces, so the merged order indexes them with an offset of opaque_count
+            order = np.concatenate((opaque_order, transparent_order + opaque_count))[order]
+            points = np.concatenate((processed_opaque[0], processed_transparent[0]))[order]
+            colours = np.concatenate((processed_opaque[1], processed_transparent[1]))[order]
+            transparent = (order >= opaque_count)
+
+        with self.profiler.stage("draw"):
+            # Python ints and tuples are much faster for pygame to read than NumPy scalars
+            for face_points, colour, face_transparent in zip(points.tolist(), colours.tolist(), transparent.tolist()):
+                # Requirement - FO1
+                if face_transparent and not self.wireframe:
+                    # gfxdraw blends the colour with what has already been drawn
+                    gfxdraw.filled_polygon(self.surface, face_points, (*colour, TRANSPARENT_ALPHA))
+                else:
+                    pg.draw.polygon(self.surface, colour, face_points, width=self.wireframe)
+                if OUTLINE:
+                    gfxdraw.aapolygon(self.surface, face_points, (0, 0, 0))
+
+        self.profiler.count("faces_drawn", faces_processed)
+
+    def renderUI(self, held_colour, fps):
         # Requirement - U6
         # Requirement - FO2
 
@@ -402,174 +898,84 @@ class Renderer:
 
         # Held Voxel
         pg.draw.rect(self.surface, (0, 0, 0), ((0, HEIGHT-127), (127, 127)), 2)
-        pg.draw.rect(self.surface, world.voxel_types[player.voxel_type-1], ((0, HEIGHT-125), (125, 125)))
+        pg.draw.rect(self.surface, held_colour, ((0, HEIGHT-125), (125, 125)))
 
         # FPS text
-        text = font.render(f"FPS: {str(fps)}", True, (255, 255, 255))
-        screen.blit(text)
+        text = self.font.render(f"FPS: {str(fps)}", True, (255, 255, 255))
+        self.surface.blit(text, (5, 5))
 
-    def __sortFaces(self, mesh):
+        # Per-stage timings and counters
+        if self.profiler.visible:
+            self.profiler.renderOverlay(self.surface, self.font)
+
+    def __sortFaces(self, depths, distances):
         # Requirement - FP10
-        # Sort the mesh based on depth in reverse order
-        for i in range(1, len(mesh)):
+        # Insertion sort of the faces based on distance, then depth, in reverse order - returns the order of the faces
+        # Only used when INSERTION_SORT is set, as it is O(n^2)
+        order = list(range(len(depths)))
+        for i in range(1, len(order)):
             j = i
-            temp = mesh[i]
-            while j > 0 and mesh[j-1][2] < temp[2]:
-                mesh[j] = mesh[j-1]
+            temp = order[i]
+            while j > 0 and (distances[order[j-1]], depths[order[j-1]]) < (distances[temp], depths[temp]):
+                order[j] = order[j-1]
                 j -= 1
-            mesh[j] = temp
-        return mesh
-
-
-class DatabaseManager:
-    def connectToWorldsDatabase(self):
-        # Attempt to connect to worlds database
-        self.worlds_database = self.__connectToDatabase("WorldsData", self.createNewWorldsDatabase)
-
-    def connectToVoxelsDatabase(self, world_name):
-        # Attempt to connect to voxels database
-        self.voxels_database = self.__connectToDatabase(f"{world_name}_VoxelsData", self.createNewVoxelsDatabase)
-
-    def __connectToDatabase(self, database_name, create_database_func):
-        retry_attempts = 3
-        for i in range(retry_attempts):
-            print(f"Attempting to connect to {database_name} database: attempt {i}")
-            try:
-                connection = mysql.connector.connect(
-                    host="localhost",
-                    user="root",
-                    password="root",
-                    database=database_name
-                    )
-                print(f"Connected to {database_name} database")
-                return connection
-            except mysql.connector.Error as e:
-                print(f"Could not connect to {database_name} database: {e}")
-                print(f"Creating new {database_name} database")
-                create_database_func()
-
-        raise Exception(f"Failed to connect to {database_name} after {retry_attempts} attempts")
-
-    def fetchWorld(self, world_name):
-        with self.worlds_database.cursor() as worlds_cursor:
-            worlds_cursor.execute("SELECT * FROM worlds WHERE world_name = %s", 
-                                (world_name,))
-            result = worlds_cursor.fetchall()
-
-        # Raise an exception if the world doesn't exist
-        # This means other functions can create a new world rather than using the empty list
-        if len(result) == 0:
-            raise Exception(f"{world_name} does not exist")
-
-        return result
-
-    def fetchVoxelTypes(self):
-        # Query the database for existing voxel types
-        with self.voxels_database.cursor() as voxels_cursor:
-            voxels_cursor.execute("SELECT * FROM voxel_types")
-            result = voxels_cursor.fetchall()
-        return result
-
-    def addWorld(self, world_name, chunk_size, sky_colour, world_seed):
-        with self.worlds_database.cursor() as worlds_cursor:
-            worlds_cursor.execute("INSERT INTO worlds (world_name, chunk_size, sky_colour_r, sky_colour_g, sky_colour_b, world_seed) VALUES (%s, %s, %s, %s, %s, %s)",
-                                    (world_name, chunk_size, sky_colour[0], sky_colour[1], sky_colour[2], world_seed))
-
-    def addVoxelType(self, voxel_colour, transparent):
-        # Append a new voxel type to the database
-        with self.voxels_database.cursor() as voxels_cursor:
-            voxels_cursor.execute("INSERT INTO voxel_types (red, green, blue, transparent) VALUES (%s, %s, %s, %s)", 
-                                (voxel_colour[0], voxel_colour[1], voxel_colour[2], transparent))
-
-    def createNewWorldsDatabase(self):
-        try:
-            # Connect to MySQL server (generic, not any specific database)
-            mysql_connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="root"
-            )
-            cursor = mysql_connection.cursor()
-            
-            # Create database
-            cursor.execute("CREATE DATABASE IF NOT EXISTS WorldsData")
-            
-            # Connect to the new database
-            mysql_connection.database = "WorldsData"
-            
-            # Create Worlds Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS worlds (
-                    world_id INT AUTO_INCREMENT PRIMARY KEY,
-                    world_name VARCHAR(20) NOT NULL,
-                    chunk_size INT NOT NULL,
-                    sky_colour_r INT NOT NULL,
-                    sky_colour_g INT NOT NULL,
-                    sky_colour_b INT NOT NULL,
-                    world_seed INT NOT NULL
-                )""")
-            
-            # Commit connection
-            mysql_connection.commit()
-
-        except mysql.connector.Error as e:
-            print(f"Error creating WorldsData database: {e}")
-        
-        finally:
-            if mysql_connection.is_connected():
-                cursor.close()
-                mysql_connection.close()
-
-    def createNewVoxelsDatabase(self):
-        database_name = f"{self.world_name}_VoxelsData"
-
-        try:
-            # Connect to MySQL server (generic, not any specific database)
-            mysql_connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="root"
-            )
-            cursor = mysql_connection.cursor()
-            
-            # Create database
-            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name}")
-            
-            # Connect to the new database
-            mysql_connection.database = database_name
-            
-            # Create Voxels Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS voxel_types (
-                    voxel_id INT AUTO_INCREMENT PRIMARY KEY,
-                    red INT NOT NULL,
-                    green INT NOT NULL,
-                    blue INT NOT NULL,
-                    transparent BOOLEAN NOT NULL
-                )""")
-            
-            # Commit connection
-            mysql_connection.commit()
-
-        except mysql.connector.Error as e:
-            print(f"Error creating {database_name} database: {e}")
+            order[j] = temp
+        return np.array(order, dtype=np.int64)
+
+    def __sortOpaqueFaces(self, distances):
+        # The order of the faces in reverse order of Manhattan distance
+        # Distances are small integers, so NumPy's stable sort uses a radix sort
+        return np.argsort(-distances.astype(np.int16), kind="stable")
+
+    def __mergeFaces(self, opaque_distances, transparent_distances):
+        # The order that merges the transparent faces into the opaque faces, keeping both in reverse order of distance,
+        # as indices into the opaque faces followed by the transparent faces
+        # A transparent face is drawn after opaque faces at the same distance, as they can't overlap
+        # Each transparent face goes before the first opaque face that is closer than it
+        insert_positions = np.searchsorted(-opaque_distances, -transparent_distances, side="right")
+        keys = np.concatenate((np.arange(len(opaque_distances)), insert_positions - 0.5))
+        return np.argsort(keys, kind="stable")
+
+
+def cullChunks(chunk_positions, chunk_size, camera_position, camera_rotation):
+    # Frustum culling of whole chunks - returns a bool for each chunk, True if it might be seen
+    # A chunk is culled if all 8 corners of its box are behind the near plane, or outside the same side of the window
+    if len(chunk_positions) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # Voxels are centred on integer positions, so a chunk's box starts half a voxel before its first voxel
+    corner_offsets = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)]) * chunk_size - 0.5
+    corners = chunk_positions[:, np.newaxis, :] * chunk_size + corner_offsets - np.array(camera_position)
+
+    # The same rotation as processFace()
+    sin_yaw =   math.sin(math.radians(-camera_rotation[0]))
+    cos_yaw =   math.cos(math.radians(-camera_rotation[0]))
+    sin_pitch = math.sin(math.radians(camera_rotation[1]))
+    cos_pitch = math.cos(math.radians(camera_rotation[1]))
+    x, y, z = corners[..., 0], corners[..., 1], corners[..., 2]
+    x, z = x * cos_yaw + z * sin_yaw, -x * sin_yaw + z * cos_yaw
+    y, z = y * cos_pitch - z * sin_pitch, y * sin_pitch + z * cos_pitch
 
-        finally:
-            if mysql_connection.is_connected():
-                cursor.close()
-                mysql_connection.close()
+    # projectVertex() maps x/z and y/z from -1 to 1 onto the window
+    outside = ((z < NEAR).all(axis=1) |
+               (x > z).all(axis=1) | (x < -z).all(axis=1) |
+               (y > z).all(axis=1) | (y < -z).all(axis=1))
+    return ~outside
 
-    def close(self):
-        self.worlds_database.commit()
-        self.worlds_database.close()
 
-        self.voxels_database.commit()
-        self.voxels_database.close()
+# Settings used by the kernels are passed to them as arguments, rather than read as globals
+# Numba freezes globals into the compiled code it caches to disk, and doesn't recompile when settings.py changes
+KERNEL_SCREEN = (float(WIDTH), float(HEIGHT), float(CENTRE[0]), float(CENTRE[1]), float(NEAR))  # (width, height, centre x, centre y, near)
+KERNEL_PACKING = (PACKED_POSITION_BITS, PACKED_FACE_INDEX_SHIFT)
 
 
-def processMesh(mesh, camera_position, camera_rotation):
-    # Using the mesh, return a list of faces that must be drawn
-    processed_mesh = []  # (Points, Colour, Depth)
+def processMesh(mesh, ranges, origins, camera_position, camera_rotation):
+    # Using the mesh, return arrays of the faces that must be drawn
+    # (Points, Colours, Depths, Distances)
+    # ranges are the (start, end) faces of each chunk to process, and origins the position of each chunk's first voxel
+    if len(mesh) == 0 or len(ranges) == 0:
+        return (np.empty((0, 4, 2), dtype=np.int32), np.empty((0, 3), dtype=np.uint8),
+                np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int32))
 
     # These values are unique to each frame, so computing them per face is redundant
     sin_yaw =   math.sin(math.radians(-camera_rotation[0]))
@@ -577,25 +983,69 @@ def processMesh(mesh, camera_position, camera_rotation):
     sin_pitch = math.sin(math.radians(camera_rotation[1]))
     cos_pitch = math.cos(math.radians(camera_rotation[1]))
     
-    for face in mesh:
-        processed_face = processFace(face.mesh, face.position, face.normal, camera_position, sin_yaw, cos_yaw, sin_pitch, cos_pitch)
-        if processed_face != None:
-            points, depth = processed_face
-            processed_mesh.append((points, face.colour, depth))
-    return processed_mesh
+    points, depths, distances, visible = processFaces(mesh.faces, ranges, origins, camera_position, sin_yaw, cos_yaw, sin_pitch, cos_pitch,
+                                                      FACE_VERTICES, FACE_NORMALS_ARRAY, KERNEL_SCREEN, KERNEL_PACKING)
+
+    # The colours are precomputed when the chunk is meshed, so they are only read here
+    colours = mesh.colours[visible]
+    return points, colours, depths, distances
+
+
+@njit(fastmath=True, cache=True)
+def processFaces(faces, ranges, origins, camera_position, sin_yaw, cos_yaw, sin_pitch, cos_pitch, face_vertices, face_normals, screen, packing):
+    # Process the packed faces in each chunk's range, returning the points, depths and distances of the visible faces,
+    # along with their indices in the mesh
+    # face_vertices and face_normals are FACE_VERTICES and FACE_NORMALS_ARRAY, screen is KERNEL_SCREEN and packing is KERNEL_PACKING
+    face_count = 0
+    for chunk in range(len(ranges)):
+        face_count += ranges[chunk, 1] - ranges[chunk, 0]
+    points = np.empty((face_count, 4, 2), dtype=np.int32)
+    depths = np.empty(face_count, dtype=np.float64)
+    distances = np.empty(face_count, dtype=np.int32)
+    visible = np.empty(face_count, dtype=np.int64)
+
+    position_bits, face_index_shift = packing
+    position_mask = (1 << position_bits) - 1
+    visible_count = 0
+    for chunk in range(len(ranges)):
+        for i in range(ranges[chunk, 0], ranges[chunk, 1]):
+            # Unpack the face
+            face = faces[i]
+            voxel_position = (
+                np.float64(origins[chunk, 0] + (face & position_mask)),
+                np.float64(origins[chunk, 1] + ((face >> position_bits) & position_mask)),
+                np.float64(origins[chunk, 2] + ((face >> 2 * position_bits) & position_mask)),
+            )
+            face_index = (face >> face_index_shift) & 7
 
+            processed_face = processFace(face_vertices[face_index], face_normals[face_index], voxel_position, camera_position,
+                                         sin_yaw, cos_yaw, sin_pitch, cos_pitch, screen)
+            if processed_face is None:
+                continue
+            face_points, depth, distance = processed_face
+            points[visible_count] = face_points
+            depths[visible_count] = depth
+            distances[visible_count] = distance
+            visible[visible_count] = i
+            visible_count += 1
 
-@njit(fastmath=True)
-def processFace(face_mesh, voxel_position, face_normal, camera_position, sin_yaw, cos_yaw, sin_pitch, cos_pitch):
+    return points[:visible_count], depths[:visible_count], distances[:visible_count], visible[:visible_count]
+
+
+@njit(fastmath=True, cache=True)
+def processFace(corners, face_normal, voxel_position, camera_position, sin_yaw, cos_yaw, sin_pitch, cos_pitch, screen):
         # Requirement - FP9
         """
         - Check backface visibility
         If face is visible:
+            - Expand the corners around the voxel position
             - Rotate
             - Project
             - Return processed_face
         """
 
+        width, height, centre_x, centre_y, near = screen
+
         is_visible = checkBackfaceVisibility(face_normal, voxel_position, camera_position)
         
         # If it's not visible, skip the rest of the function
@@ -607,11 +1057,12 @@ def processFace(face_mesh, voxel_position, face_normal, camera_position, sin_yaw
 
         inside = False  # Flag that stores if any vertices of the face are inside the window
 
-        for i, vertex in enumerate(face_mesh):
+        for i in range(4):
+            corner = corners[i]
             translated_vertex = (
-                vertex[0] - camera_position[0],
-                vertex[1] - camera_position[1],
-                vertex[2] - camera_position[2],
+                voxel_position[0] + corner[0] - camera_position[0],
+                voxel_position[1] + corner[1] - camera_position[1],
+                voxel_position[2] + corner[2] - camera_position[2],
             )
 
             x, y, z = translated_vertex
@@ -620,13 +1071,13 @@ def processFace(face_mesh, voxel_position, face_normal, camera_position, sin_yaw
             rotated_vertex = x, y, z
 
             # Frustum Culling - Don't render if not in view frustum (behind camera)
-            if rotated_vertex[2] < NEAR:
+            if rotated_vertex[2] < near:
                 return None
             
-            projected_x, projected_y = projectVertex(rotated_vertex)
+            projected_x, projected_y = projectVertex(rotated_vertex, centre_x, centre_y)
 
             # If any vertex is inside the window, render the face
-            if 0 <= projected_x <= WIDTH or 0 <= projected_y <= HEIGHT:
+            if 0 <= projected_x <= width or 0 <= projected_y <= height:
                 inside = True
 
             processed_face[i][0] = np.int32(projected_x)
@@ -640,10 +1091,17 @@ def processFace(face_mesh, voxel_position, face_normal, camera_position, sin_yaw
         depth = ((voxel_position[0] - camera_position[0])**2 + (voxel_position[1] - camera_position[1])**2 + (voxel_position[2] - camera_position[2])**2)
         #depth = np.linalg.norm(relative_voxel_position)
 
-        return processed_face, depth
+        # Manhattan distance from the voxel the camera is in, used to order faces (see Renderer.renderMesh)
+        distance = np.int32(
+            abs(voxel_position[0] - np.floor(camera_position[0] + 0.5)) +
+            abs(voxel_position[1] - np.floor(camera_position[1] + 0.5)) +
+            abs(voxel_position[2] - np.floor(camera_position[2] + 0.5))
+            )
+
+        return processed_face, depth, distance
 
 
-@njit(fastmath=True)
+@njit(fastmath=True, cache=True)
 def checkBackfaceVisibility(normal, voxel_position, camera_position):
         face_to_camera = (
                         (voxel_position[0] - camera_position[0]) * normal[0] +
@@ -654,19 +1112,35 @@ def checkBackfaceVisibility(normal, voxel_position, camera_position):
         return is_visible
         
 
-@njit(fastmath=True)
-def projectVertex(vertex):
-    projected_x = ((vertex[0] / vertex[2]) + 1) * CENTRE[0]
-    projected_y = ((vertex[1] / vertex[2]) + 1) * CENTRE[1]
+@njit(fastmath=True, cache=True)
+def projectVertex(vertex, centre_x, centre_y):
+    projected_x = ((vertex[0] / vertex[2]) + 1) * centre_x
+    projected_y = ((vertex[1] / vertex[2]) + 1) * centre_y
     return projected_x, projected_y
 
 
-def inputNewVoxel():
+def warmUpKernels():
+    # Compile the kernels before the first frame, rather than hitching while it's drawn
+    # cache=True saves the compiled code to __pycache__, so after the first launch this only loads it
+    # Settings are passed to the kernels as arguments (see KERNEL_SCREEN), so changing them doesn't need the cache clearing
+    # The arguments must have the same types as the ones used in game, or they would be compiled again
+    voxel_types = VoxelTypes([(1, 0, 0, 0, False)])
+    chunk = Chunk((0, 0, 0), np.ones(CHUNK_VOLUME, dtype=np.uint8), CHUNK_SIZE, voxel_types)
+    ranges = meshRanges([chunk.opaque_mesh])
+    origins = np.zeros((1, 3), dtype=np.int64)
+    camera_position = (0.0, 0.0, -2.0)  # In front of the chunk, so every kernel is run
+    processMesh(chunk.opaque_mesh, ranges, origins, camera_position, (0.0, 0.0, 0.0))
+
+
+def inputNewVoxel(database, world):
     # Requirement - U4
     # Requirement - FI5
     # Requirement - FP4
 
 
+    # tkinter is only needed when a dialog is opened, so it isn't imported at startup
+    import tkinter as tk
+
     # Unlock the mouse
     pg.mouse.set_visible(True)
     pg.event.set_grab(False)
@@ -732,9 +1206,12 @@ def inputNewVoxel():
     world.updateVoxelList()
 
 
-def getWorld():
+def getWorld(database):
     # Requirement - FI6
 
+    # tkinter is only needed when a dialog is opened, so it isn't imported at startup
+    import tkinter as tk
+
     # Unlock the mouse
     pg.mouse.set_visible(True)
     pg.event.set_grab(False)
@@ -790,87 +1267,191 @@ def getWorld():
     return world_name, chunk_size, (sky_r, sky_g, sky_b), world_seed
 
 
-pg.init()
+class Engine:
+    """
+    Runs the simulation (movement, edits and chunk loading) at a fixed TICK_RATE, separately from rendering.
+    Each frame, the time since the last frame is added to an accumulator and the simulation ticks until it has caught up,
+    then the camera is drawn interpolated between its last two ticks.
+    A slow frame runs more ticks rather than slowing the simulation down, up to MAX_TICKS_PER_FRAME.
 
-# Requirement - FP1
-screen = pg.display.set_mode((WIDTH, HEIGHT), flags=pg.DOUBLEBUF)
-font = pg.font.Font(None, 24)
-clock = pg.time.Clock()
-previous_time = 0
+    simulate is called once per tick with the length of a tick in milliseconds.
+    """
+    def __init__(self, world, camera, renderer, profiler, simulate, tick_rate=TICK_RATE):
+        self.world = world
+        self.camera = camera
+        self.renderer = renderer
+        self.profiler = profiler
+        self.simulate = simulate
+        self.tick_delta = 1000 / tick_rate  # Milliseconds
+        self.accumulator = 0.0  # Time that hasn't been simulated yet
+
+    def tick(self):
+        self.camera.storePreviousState()
+        with self.profiler.stage("update"):
+            self.simulate(self.tick_delta)
+        self.profiler.count("ticks")
+
+    def advance(self, elapsed):
+        # Run as many ticks as fit in the elapsed time (milliseconds), returning how many were run
+        self.accumulator += elapsed
+        ticks = 0
+        while self.accumulator >= self.tick_delta:
+            if ticks == MAX_TICKS_PER_FRAME:
+                # Too far behind to catch up - drop the time rather than spending even longer on ticks next frame
+                self.accumulator %= self.tick_delta
+                break
+            self.tick()
+            self.accumulator -= self.tick_delta
+            ticks += 1
+        return ticks
+
+    def render(self, held_type, fps):
+        # Draw the world from part way between the last two ticks, by how far through the next tick we are
+        alpha = self.accumulator / self.tick_delta
+        self.renderer.render(self.world, self.camera.interpolate(alpha), held_type, fps)
+
+
+def main():
+    pg.init()
+
+    # Requirement - FP1
+    screen = pg.display.set_mode((WIDTH, HEIGHT), flags=pg.DOUBLEBUF)
+    font = pg.font.Font(None, 24)
+    clock = pg.time.Clock()
+    previous_time = 0
+
+    # Requirement - FP2
+    database = createStorage()
+    database.connectToWorldsDatabase()  # The Worlds database is needed for the getWorld() function
+    # Time spent waiting on dialogs is left out of the time to first frame
+    dialog_start = time.perf_counter()
+    world_name, chunk_size, sky_colour, world_seed = getWorld(database)
+    dialog_time = time.perf_counter() - dialog_start
+    database.connectToVoxelsDatabase(world_name)
+
+    # Requirement - FP3
+    profiler = Profiler()
+    renderer = Renderer(screen, sky_colour, font, profiler)
+    terrain_generator = TerrainGenerator(world_seed)
+    world = World(world_name, chunk_size, database, terrain_generator, profiler)
+    player = Player((0, -2, 0), (0, 0, 0), world) 
 
-# Requirement - FP2
-database = DatabaseManager()  
-database.connectToWorldsDatabase()  # The Worlds database is needed for the getWorld() function
-world_name, chunk_size, sky_colour, world_seed = getWorld()
-database.world_name = world_name
-database.connectToVoxelsDatabase(world_name)
+    world.updateVoxelList()
+    print("Fetched voxel types")
+    if len(world.voxel_types) == 0:
+        dialog_start = time.perf_counter()
+        inputNewVoxel(database, world)
+        dialog_time += time.perf_counter() - dialog_start
 
-# Requirement - FP3
-player = Player((0, -2, 0), (0, 0, 0)) 
-renderer = Renderer(screen, sky_colour)
-world = World(world_name, chunk_size)
-terrain_generator = TerrainGenerator(world_seed)
+    compile_start = time.perf_counter()
+    warmUpKernels()
+    print(f"Compiled kernels in {time.perf_counter() - compile_start:.2f}s")
 
-world.updateVoxelList()
-print("Fetched voxel types")
-if len(world.voxel_types) == 0:
-    inputNewVoxel()
+    pg.display.set_caption(f"Voxel Game: {world.name}")
 
-pg.display.set_caption(f"Voxel Game: {world.name}")
+    # Record the camera path and edits so they can be replayed by benchmark.py
+    recording = CameraPath() if RECORD_PATH is not None else None
 
-# Mouse lock
-if GRAB_MOUSE:
-    pg.mouse.set_visible(False)
-    pg.event.set_grab(True)
+    # Input is gathered every frame, and used by the next tick
+    keys = pg.key.get_pressed()
+    mouse_movement = [0, 0]  # Mouse movement since the last tick
+
+    def simulate(delta):
+        # Requirement - FP5
+        player.rotate(mouse_movement, delta)
+        mouse_movement[:] = [0, 0]
+        player.move(keys, delta)
+        edit = player.placeVoxels()
+
+        world.update(player)
+
+        if recording is not None:
+            if edit is not None:
+                recording.recordEdit(*edit)
+            recording.record(player)
+
+    engine = Engine(world, player, renderer, profiler, simulate)
+    governor = MemoryGovernor(profiler)
+
+    # Mouse lock
+    if GRAB_MOUSE:
+        pg.mouse.set_visible(False)
+        pg.event.set_grab(True)
+
+    first_frame = True
+    running = True
+    while running:
+        # Time and frame rate
+        current_time = pg.time.get_ticks()
+        delta = max(current_time - previous_time, 1)
+        previous_time = current_time
+        fps = round(clock.get_fps(), 2)
+
+        profiler.beginFrame()
+
+        # Player logic: Requirement - FP5
+        with profiler.stage("input"):
+            for event in pg.event.get():  
+                # Camera Rotation
+                if event.type == pg.MOUSEMOTION:
+                    mouse_movement[0] += event.rel[0]
+                    mouse_movement[1] += event.rel[1]
+
+                # Voxel Type - Changes with scroll wheel
+                if event.type == pg.MOUSEWHEEL:
+                    player.updateVoxelType(event.y)
+
+                if event.type == pg.KEYDOWN:
+                    if event.key == pg.K_e:
+                        renderer.wireframe = not renderer.wireframe
+                    
+                    if event.key == pg.K_r:
+                        inputNewVoxel(database, world)
 
-running = True
-while running:
-    # Time and frame rate
-    current_time = pg.time.get_ticks()
-    delta = max(current_time - previous_time, 1)
-    previous_time = current_time
-    fps = round(clock.get_fps(), 2)
-
-    # Player logic: Requirement - FP5
-    for event in pg.event.get():  
-        # Camera Rotation
-        if event.type == pg.MOUSEMOTION:
-            relative_mouse_movement = event.rel
-            player.rotate(relative_mouse_movement, delta)
-
-        # Voxel Type - Changes with scroll wheel
-        if event.type == pg.MOUSEWHEEL:
-            player.updateVoxelType(event.y)
-
-        if event.type == pg.KEYDOWN:
-            if event.key == pg.K_e:
-                WIREFRAME = not WIREFRAME
-            
-            if event.key == pg.K_r:
-                inputNewVoxel()
+                    if event.key == PROFILER_KEY:
+                        profiler.visible = not profiler.visible
 
-    keys = pg.key.get_pressed()
+            keys = pg.key.get_pressed()
 
-    # Quit the game if the escape key is pressed
-    if keys[pg.K_ESCAPE]:
-        running = False
-    
-    # Requirement - FP5
-    player.move(keys, delta)
-    player.placeVoxels()
+        # Quit the game if the escape key is pressed
+        if keys[pg.K_ESCAPE]:
+            running = False
+        
+        # Simulate, then render
+        if first_frame:
+            # The first frame includes loading the world, so it is simulated as one tick rather than catching up
+            engine.tick()
+        else:
+            engine.advance(delta)
+        engine.render(player.voxel_type, fps)
+        governor.update(world, renderer, database)
+
+        with profiler.stage("flip"):
+            pg.display.flip()
+
+        # The frame ends before clock.tick(), so the time spent waiting for the frame cap isn't recorded
+        profiler.endFrame()
+
+        if first_frame:
+            first_frame = False
+            time_to_first_frame = time.perf_counter() - START_TIME - dialog_time
+            print(f"Time to first frame: {time_to_first_frame:.2f}s (excluding {dialog_time:.2f}s in dialogs)")
+
+        clock.tick(MAX_FPS)
 
-    world.update(player)
+    # Unloading the chunks saves them to file, meaning the game autosaves whenever you quit
+    # loadedPositions() returns a copy, as unloading removes chunks from the index
+    for chunk_position in world.loadedPositions():
+        world.unloadChunk(chunk_position)
 
-    # Render
-    renderer.render(world.mesh)
+    if recording is not None:
+        recording.save(RECORD_PATH)
 
-    pg.display.flip()
-    clock.tick(MAX_FPS)
+    database.close()
+    profiler.close()
 
-# Unloading the chunks saves them to file, meaning the game autosaves whenever you quit
-for chunk in world.chunks:
-    world.unloadChunk(chunk.position)
+    pg.quit()
 
-database.close()
 
-pg.quit()
+if __name__ == "__main__":
+    main()
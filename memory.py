@@ -0,0 +1,88 @@
+from settings import *
+import sys
+
+
+class MemoryGovernor:
+    """
+    This class accounts for the memory used by each subsystem, and keeps the total inside a budget.
+    The subsystems are:
+        - voxels: Voxel arrays and brick maps of loaded chunks
+        - chunk_meshes: Chunk mesh arrays not shared with the world meshes (chunks remeshed since the world mesh was built)
+        - world_mesh: The meshes the renderer draws, and the range of each chunk's faces in them
+        - caches: The storage backend's voxel type cache, the voxel type lookup tables and the chunk index (including the Chunk objects)
+        - render_buffers: The surface frames are drawn on, and the faces processed for the last frame
+
+    The caches are small and mostly needed every frame, so the only lever is the load radius, which most of the rest scales with.
+    When usage is above MEMORY_HIGH_WATERMARK of the budget, the world's load radius is lowered,
+    and once it is below MEMORY_LOW_WATERMARK the load radius is raised back towards LOAD_RADIUS,
+    as long as the larger radius isn't expected to go straight back over MEMORY_HIGH_WATERMARK
+    (the peak last measured at that radius, or an estimate if it hasn't been used).
+    Decisions use the peak usage over the last MEMORY_GOVERNOR_INTERVAL frames, as render buffers change with the view,
+    and the radius is changed at most once per interval, so chunks have time to load or unload before the next change.
+    """
+    def __init__(self, profiler, budget_mb=MEMORY_BUDGET_MB):
+        self.profiler = profiler
+        self.budget = budget_mb * 1024**2  # Bytes
+        self.usage = dict.fromkeys(MEMORY_SUBSYSTEMS, 0)  # Bytes used by each subsystem, as of the last update
+        self.interval_frames = 0
+        self.peak = 0  # Highest total this interval
+        self.radius_peaks = {}  # Load radius -> peak total of the last interval spent at that radius
+
+    def total(self):
+        return sum(self.usage.values())
+
+    def measure(self, world, renderer, database):
+        chunks = world.chunks.values()
+        self.usage["voxels"] = sum(chunk.voxels.nbytes + chunk.bricks.nbytes for chunk in chunks)
+        self.usage["chunk_meshes"] = sum(chunk.opaque_mesh.nbytes(owned_only=True) + chunk.transparent_mesh.nbytes(owned_only=True)
+                                         for chunk in chunks)
+        self.usage["world_mesh"] = (world.opaque_mesh.nbytes() + world.transparent_mesh.nbytes() +
+                                    world.opaque_ranges.nbytes + world.transparent_ranges.nbytes + world.mesh_chunk_positions.nbytes)
+
+        # The chunk index holds a tuple per chunk position, and each Chunk object with its Mesh objects
+        index_bytes = sys.getsizeof(world.chunks) + sys.getsizeof(world.empty_chunks)
+        index_bytes += (len(world.chunks) + len(world.empty_chunks)) * sys.getsizeof((0, 0, 0))
+        index_bytes += sum(objectBytes(chunk) + objectBytes(chunk.opaque_mesh) + objectBytes(chunk.transparent_mesh) for chunk in chunks)
+        voxel_type_bytes = world.voxel_types.colours.nbytes + world.voxel_types.flags.nbytes + world.voxel_types.transparent.nbytes
+        storage_bytes = sys.getsizeof(database.voxel_types_cache) if database.voxel_types_cache is not None else 0
+        self.usage["caches"] = index_bytes + voxel_type_bytes + storage_bytes + world.load_offsets.nbytes
+
+        surface = renderer.surface
+        self.usage["render_buffers"] = surface.get_pitch() * surface.get_height() + renderer.buffer_bytes
+        return self.total()
+
+    def update(self, world, renderer, database):
+        # Measure usage, then change the load radius if needed
+        total = self.measure(world, renderer, database)
+        self.profiler.count("memory_kb", total // 1024)
+
+        self.peak = max(self.peak, total)
+        self.interval_frames += 1
+        if self.interval_frames < MEMORY_GOVERNOR_INTERVAL:
+            return total
+        self.radius_peaks[world.load_radius] = self.peak
+
+        if self.peak > self.budget * MEMORY_HIGH_WATERMARK:
+            if world.load_radius > MIN_LOAD_RADIUS:
+                world.load_radius = max(world.load_radius - MEMORY_RADIUS_STEP, MIN_LOAD_RADIUS)
+                print(f"Memory use {self.peak / 1024**2:.1f}MB is near the {self.budget / 1024**2:.1f}MB budget - lowering load radius to {world.load_radius}")
+        elif self.peak < self.budget * MEMORY_LOW_WATERMARK and world.load_radius < LOAD_RADIUS:
+            radius = min(world.load_radius + MEMORY_RADIUS_STEP, LOAD_RADIUS)
+            # Most memory scales with the area loaded - the radius, plus about a chunk for partly loaded chunks and lookahead
+            expected_peak = self.radius_peaks.get(radius, self.peak * ((radius + 1) / (world.load_radius + 1))**2)
+            if expected_peak < self.budget * MEMORY_HIGH_WATERMARK:
+                world.load_radius = radius
+
+        # Start the next interval
+        self.interval_frames = 0
+        self.peak = 0
+        return total
+
+    def report(self):
+        # Usage of each subsystem in megabytes
+        return {name: round(value / 1024**2, 3) for name, value in self.usage.items()}
+
+
+def objectBytes(instance):
+    # Size of an object and its attribute dictionary, not including the attributes themselves
+    return sys.getsizeof(instance) + sys.getsizeof(vars(instance))
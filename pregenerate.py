@@ -0,0 +1,143 @@
+"""
+World pre-generation
+
+Generates, meshes and saves a region of chunks around a spawn point, across every core,
+so the game loads them from disk instead of generating them while the player walks.
+
+Usage:
+    python pregenerate.py my_world --radius 16
+    python pregenerate.py my_world --centre 10 0 -4 --radius 8 --vertical 2 --workers 4
+
+Empty chunks aren't saved, as the game generates them again just as quickly.
+Finished chunks are recorded in a progress file for the region, so an interrupted run can be resumed by running it again.
+Chunks that are already saved, e.g. edited in game, are skipped rather than overwritten.
+"""
+import os
+# Every worker imports pygame, so hide its banner
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import *
+from storage import createStorage
+from multiprocessing import Pool
+import argparse
+import time
+import sys
+
+
+# Set in each worker process by initWorker()
+worker_state = {}
+
+
+def initWorker(world_name, chunk_size, world_seed, raw_voxel_list):
+    # Each worker builds its own generator and lookup tables once, rather than per chunk
+    worker_state["world_name"] = world_name
+    worker_state["chunk_size"] = chunk_size
+    worker_state["terrain_generator"] = TerrainGenerator(world_seed)
+    worker_state["voxel_types"] = VoxelTypes(raw_voxel_list)
+
+
+def pregenerateChunk(position):
+    # Returns the position, and whether the chunk was saved
+    voxel_types = worker_state["voxel_types"]
+    voxels = worker_state["terrain_generator"].generateChunk(position, len(voxel_types))
+    # World never saves empty chunks, so they aren't saved here either
+    if not voxels.any():
+        return position, False
+    chunk = Chunk(position, voxels, worker_state["chunk_size"], voxel_types)
+
+    # The same file names World uses, so the game loads the chunk and its mesh from disk
+    chunk.save(worker_state["world_name"] + "/" + str(tuple(position)))
+    return position, True
+
+
+def regionPositions(centre, radius, vertical):
+    # Every chunk position in the region, nearest to the centre first so an interrupted run is still useful
+    offsets = [(x, y, z)
+               for x in range(-radius, radius + 1)
+               for y in range(-vertical, vertical + 1)
+               for z in range(-radius, radius + 1)]
+    offsets.sort(key=lambda offset: offset[0]**2 + offset[1]**2 + offset[2]**2)
+    return [(centre[0] + x, centre[1] + y, centre[2] + z) for x, y, z in offsets]
+
+
+def isSaved(world_name, position):
+    return os.path.exists(world_name + "/" + str(tuple(position)) + ".npy")
+
+
+def progressPath(world_name, centre, radius, vertical):
+    # The progress file of a region - one line per finished chunk position
+    return f"{world_name}/pregenerate {tuple(centre)} {radius} {vertical}.txt"
+
+
+def loadProgress(progress_path):
+    # The chunk positions a previous run of the region finished
+    try:
+        with open(progress_path) as file:
+            return {tuple(int(axis) for axis in line.split()) for line in file if line.strip()}
+    except OSError:
+        return set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, mesh and save a region of a world ahead of time")
+    parser.add_argument("world", help="Name of the world - created if it doesn't exist")
+    parser.add_argument("--centre", type=int, nargs=3, default=(0, 0, 0), metavar=("X", "Y", "Z"), help="Centre of the region, in chunks")
+    parser.add_argument("--radius", type=int, default=8, help="Horizontal radius of the region, in chunks")
+    parser.add_argument("--vertical", type=int, default=1, help="Vertical radius of the region, in chunks")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of processes (default: every core)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the world, if it is created")
+    args = parser.parse_args()
+
+    database = createStorage()
+    database.connectToWorldsDatabase()
+    try:
+        world = database.fetchWorld(args.world)
+    except Exception:
+        print(f"Creating new world {args.world}")
+        database.addWorld(args.world, CHUNK_SIZE, SKY_COLOR, args.seed)
+        world = database.fetchWorld(args.world)
+    world_id, world_name, chunk_size, sky_r, sky_g, sky_b, world_seed = world[0]
+
+    database.connectToVoxelsDatabase(world_name)
+    raw_voxel_list = database.fetchVoxelTypes()
+    database.close()
+    if len(raw_voxel_list) == 0:
+        sys.exit(f"{world_name} has no voxel types - add one in game first")
+
+    if not os.path.exists(world_name):
+        os.makedirs(world_name)
+
+    # Resume by skipping chunks a previous run finished, and chunks that are already saved
+    positions = regionPositions(args.centre, args.radius, args.vertical)
+    progress_path = progressPath(world_name, args.centre, args.radius, args.vertical)
+    finished = loadProgress(progress_path)
+    remaining = [position for position in positions if position not in finished and not isSaved(world_name, position)]
+    print(f"{len(positions) - len(remaining)} of {len(positions)} chunks already done")
+    if len(remaining) == 0:
+        return
+
+    start_time = time.perf_counter()
+    last_report = 0
+    saved = 0
+    # Line buffered, so every finished chunk is recorded even if the run is interrupted
+    with Pool(args.workers, initializer=initWorker, initargs=(world_name, chunk_size, world_seed, raw_voxel_list)) as pool, \
+         open(progress_path, "a", buffering=1) as progress_file:
+        for done, (position, was_saved) in enumerate(pool.imap_unordered(pregenerateChunk, remaining, chunksize=4), start=1):
+            progress_file.write(" ".join(str(axis) for axis in position) + "\n")
+            saved += was_saved
+
+            elapsed = time.perf_counter() - start_time
+            # Progress is reported a few times a second, rather than for every chunk
+            if elapsed - last_report < 0.25 and done < len(remaining):
+                continue
+            last_report = elapsed
+
+            rate = done / elapsed
+            eta = (len(remaining) - done) / rate
+            print(f"\r{done}/{len(remaining)} chunks ({rate:.1f} chunks/s, {eta:.0f}s left)", end="", flush=True)
+
+    print(f"\nGenerated {len(remaining)} chunks in {time.perf_counter() - start_time:.1f}s - {saved} saved, {len(remaining) - saved} empty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from settings import *
+from collections import deque
+from contextlib import contextmanager
+import time
+import json
+import csv
+
+
+class Profiler:
+    """
+    This class records how long each stage of a frame takes, along with per-frame counters.
+    This involves:
+        - Timing stages with the stage() context manager
+        - Counting events (faces drawn, chunks loaded...) with count()
+        - Keeping a rolling history to compute percentiles from
+        - Streaming every frame's sample to a .jsonl/.ndjson (JSON Lines - one object per line) or .csv file
+
+    The overlay is drawn by the renderer when visible is set, toggled with PROFILER_KEY.
+    """
+    def __init__(self, history=PROFILER_HISTORY, export_path=PROFILER_EXPORT_PATH):
+        self.history = history
+        self.visible = False
+
+        # Rolling history of each stage/counter, one value per frame
+        self.timings = {stage: deque(maxlen=history) for stage in PROFILER_STAGES}
+        self.counters = {counter: deque(maxlen=history) for counter in PROFILER_COUNTERS}
+
+        # Values for the frame currently being recorded
+        self.frame_timings = {}
+        self.frame_counters = {}
+        self.frame_number = 0
+        self.frame_start = time.perf_counter()
+
+        self.export_file = None
+        self.csv_writer = None
+        if export_path is not None:
+            self.__openExport(export_path)
+
+    def reset(self):
+        # Clear the history, e.g. once warm-up frames are done
+        for samples in self.timings.values():
+            samples.clear()
+        for samples in self.counters.values():
+            samples.clear()
+        self.frame_number = 0
+
+    def beginFrame(self):
+        # Stages that don't run this frame are recorded as 0, so every sample has the same fields
+        self.frame_timings = dict.fromkeys(self.timings, 0.0)
+        self.frame_counters = dict.fromkeys(self.counters, 0)
+        self.frame_start = time.perf_counter()
+
+    def endFrame(self):
+        self.frame_timings["frame"] = (time.perf_counter() - self.frame_start) * 1000
+
+        for name, value in self.frame_timings.items():
+            self.timings.setdefault(name, deque(maxlen=self.history)).append(value)
+        for name, value in self.frame_counters.items():
+            self.counters.setdefault(name, deque(maxlen=self.history)).append(value)
+
+        if self.export_file is not None:
+            self.__writeSample()
+
+        self.frame_number += 1
+
+    @contextmanager
+    def stage(self, name):
+        # Time the body of a with block, adding it to the stage's total for this frame
+        # Stages can run more than once per frame (e.g. loading several chunks), so the times accumulate
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.frame_timings[name] = self.frame_timings.get(name, 0.0) + elapsed
+
+    def count(self, name, amount=1):
+        self.frame_counters[name] = self.frame_counters.get(name, 0) + int(amount)
+
+    def percentiles(self, name, percentiles=PROFILER_PERCENTILES):
+        # Rolling percentiles of a stage's timings, in milliseconds
+        samples = self.timings.get(name)
+        if not samples:
+            return np.zeros(len(percentiles))
+        return np.percentile(np.fromiter(samples, dtype=np.float64), percentiles)
+
+    def summary(self, percentiles=PROFILER_PERCENTILES):
+        # Percentiles of every stage and the mean of every counter over the history
+        stages = {}
+        for name in self.timings:
+            values = self.percentiles(name, percentiles)
+            stages[name] = {f"p{p}": round(float(value), 4) for p, value in zip(percentiles, values)}
+
+        counters = {}
+        for name, samples in self.counters.items():
+            counters[name] = round(float(np.mean(samples)), 2) if samples else 0.0
+
+        return {"frames": self.frame_number, "stages": stages, "counters": counters}
+
+    def renderOverlay(self, surface, font):
+        line_height = font.get_linesize()
+        header = "stage              " + "".join(f"p{p:<7}" for p in PROFILER_PERCENTILES)
+        lines = [header]
+
+        for name in self.timings:
+            values = self.percentiles(name)
+            lines.append(f"{name:<19}" + "".join(f"{value:<8.2f}" for value in values))
+
+        for name, samples in self.counters.items():
+            latest = samples[-1] if samples else 0
+            lines.append(f"{name:<19}{latest}")
+
+        # Darken the area behind the text so it can be read over the world
+        background = pg.Surface((400, line_height * len(lines) + 10), pg.SRCALPHA)
+        background.fill((0, 0, 0, 160))
+        surface.blit(background, (0, 30))
+
+        for i, line in enumerate(lines):
+            text = font.render(line, True, (255, 255, 255))
+            surface.blit(text, (5, 35 + i * line_height))
+
+    def close(self):
+        if self.export_file is not None:
+            self.export_file.close()
+            self.export_file = None
+
+    def __openExport(self, export_path):
+        # Samples are streamed a line at a time, so a plain .json file (one JSON value) can't be written
+        if not export_path.endswith(PROFILER_EXPORT_FORMATS):
+            raise ValueError(f"Profiler export path {export_path} must end with one of {', '.join(PROFILER_EXPORT_FORMATS)}")
+
+        # Line buffered, so every sample is written as soon as it is recorded and none are lost if the game crashes
+        self.export_file = open(export_path, "w", newline="", buffering=1)
+
+        if export_path.endswith(".csv"):
+            # CSV needs a fixed header, so only the stages and counters from settings.py are written
+            fields = ["frame_number"] + [f"{stage}_ms" for stage in PROFILER_STAGES] + list(PROFILER_COUNTERS)
+            self.csv_writer = csv.DictWriter(self.export_file, fieldnames=fields, extrasaction="ignore")
+            self.csv_writer.writeheader()
+
+    def __writeSample(self):
+        sample = {"frame_number": self.frame_number}
+        for name, value in self.frame_timings.items():
+            sample[f"{name}_ms"] = round(value, 4)
+        sample.update(self.frame_counters)
+
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(sample)
+        else:
+            # One JSON object per line, so the file can be read while the game is still running
+            self.export_file.write(json.dumps(sample) + "\n")
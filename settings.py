@@ -4,14 +4,12 @@ import math
 from numba import njit, prange
 from random import randint
 from pygame import gfxdraw
-import mysql.connector
-import tkinter as tk
 import os
 
 # Debug tools
 GRAB_MOUSE = True  # Hide the mouse and lock it to the centre of the window
 WIREFRAME = False  # Render a wireframe instead of the filled faces
-INSERTION_SORT = True  # Change from Insertion Sort to np.argsort()
+INSERTION_SORT = False  # Debug - sort transparent faces with the Insertion Sort instead of np.lexsort(), which is O(n^2)
 
 # Window
 WIDTH, HEIGHT =  1000, 1000
@@ -22,6 +20,7 @@ MAX_FPS = 120
 # World TODO refactor into database
 SKY_COLOR = (135, 206, 235)
 WIREFRAME_COLOR = (0, 127, 0)
+TRANSPARENT_ALPHA = 128  # Opacity of transparent voxels (0-255)
 
 OUTLINE = False
 
@@ -29,16 +28,70 @@ OUTLINE = False
 CHUNK_SIZE = 16
 CHUNK_AREA = CHUNK_SIZE**2
 CHUNK_VOLUME = CHUNK_SIZE**3
+# Chunks are split into bricks of BRICK_SIZE^3 voxels, so empty space inside a chunk can be skipped
+# Must divide CHUNK_SIZE
+BRICK_SIZE = 4
 
 # Player variables
 PLAYER_SPEED = 5  # Voxels per second
 PLAYER_ROTATION_SENSITIVITY = 15
 VERTICAL_FOV = 1  # (Radians)
-RENDER_DISTANCE = 4
+RAYCAST_DISTANCE = 8  # How far away voxels can be placed or removed (voxels)
+
+# Simulation - movement, edits and chunk loading run at a fixed rate, separately from rendering
+TICK_RATE = 60  # Ticks per second
+MAX_TICKS_PER_FRAME = 5  # If a frame is slower than this many ticks, the simulation slows down rather than falling further behind
+
+# Chunk loading - distances are in chunks, measured from the player to the nearest point of each chunk
+LOAD_SHAPE = "sphere"  # "sphere", "cylinder" (VERTICAL_LOAD_RADIUS up and down) or "cube"
+LOAD_RADIUS = 1
+VERTICAL_LOAD_RADIUS = 1  # Only used by "cylinder" and "cube"
+# The load shape is stretched this far in the direction the player is looking, and the direction they are moving
+VIEW_LOOKAHEAD = 0.5
+MOVEMENT_LOOKAHEAD = 0.5  # At PLAYER_SPEED - slower movement stretches it less
+MOVEMENT_SMOOTHING = 0.9  # How much of the last tick's velocity is kept, so small or back and forth steps barely stretch it
+# Chunks are unloaded this far beyond the furthest the load shape can reach, so turning or moving back and forth doesn't reload them
+UNLOAD_MARGIN = 0.5
+
+# Voxel type flags - Bits of VoxelTypes.flags
+TRANSPARENT_FLAG = 1
 
 # Clipping plane(s)
 NEAR = 0.1
 
+# Storage
+STORAGE_BACKEND = "sqlite"  # "sqlite" for a local file, or "mysql" for a MySQL server
+SQLITE_PATH = "worlds.db"
+MYSQL_HOST = "localhost"
+MYSQL_USER = "root"
+MYSQL_PASSWORD = "root"
+MYSQL_POOL_SIZE = 4
+
+# Profiler
+PROFILER_KEY = pg.K_F3  # Toggles the profiler overlay
+PROFILER_HISTORY = 240  # Number of frames the rolling percentiles are computed over
+PROFILER_PERCENTILES = (50, 95, 99)
+PROFILER_EXPORT_PATH = None  # Set to a .jsonl/.ndjson (JSON Lines) or .csv path to stream per-frame samples to file
+PROFILER_EXPORT_FORMATS = (".jsonl", ".ndjson", ".csv")
+# Stages are timed in milliseconds, counters are totals for the frame
+PROFILER_STAGES = ("input", "update", "load", "chunk_mesh", "unload", "world_mesh", "process", "sort", "draw", "ui", "flip", "frame")
+PROFILER_COUNTERS = ("faces_in", "faces_culled", "faces_drawn", "faces_transparent", "chunks_loaded", "chunks_meshed", "ticks", "memory_kb")
+
+# Memory
+MEMORY_BUDGET_MB = 256  # Total for the subsystems in MEMORY_SUBSYSTEMS
+MEMORY_SUBSYSTEMS = ("voxels", "chunk_meshes", "world_mesh", "caches", "render_buffers")
+MEMORY_HIGH_WATERMARK = 0.9  # Fraction of the budget above which the load radius is lowered
+MEMORY_LOW_WATERMARK = 0.7  # Fraction of the budget below which the load radius is raised back towards LOAD_RADIUS
+MEMORY_RADIUS_STEP = 0.25  # Chunks
+MIN_LOAD_RADIUS = 0.5
+MEMORY_GOVERNOR_INTERVAL = 30  # Frames between changes to the load radius, so chunks can load/unload before the next change
+
+# Benchmarking
+RECORD_PATH = None  # Set to a .json path to record the camera path and edits for benchmark.py to replay
+BENCHMARK_GATED_STAGES = ("chunk_mesh", "world_mesh", "process", "sort", "draw", "frame")  # Compared against the baseline
+BENCHMARK_TOLERANCE = 0.15  # Fractional slowdown allowed before a stage counts as a regression
+BENCHMARK_NOISE_FLOOR = 0.05  # Slowdowns smaller than this (milliseconds) are ignored as noise
+
 
 # Voxel model lookup tables
 VERTICES = [
@@ -71,6 +124,26 @@ FACE_NORMALS = [
     (0, 1, 0),
 ]
 
+# The same tables as NumPy arrays, for meshing whole chunks at once and expanding faces in the kernels
+FACE_NORMALS_ARRAY = np.array(FACE_NORMALS, dtype=np.int8)
+FACE_VERTICES = np.array(VERTICES, dtype=np.float32)[np.array(FACES)]  # (face, corner, xyz)
+
+# Packed faces - each face of a mesh is a single uint32, rather than its vertices, position and normal:
+#   bits 0-11   x, y and z of the voxel in its chunk, PACKED_POSITION_BITS each
+#   bits 12-14  face index - into FACE_NORMALS, FACE_VERTICES and FACE_SHADING
+#   bits 15-22  ambient occlusion level of each corner, 2 bits each
+#   bits 23-30  voxel type
+PACKED_POSITION_BITS = 4  # CHUNK_SIZE must be at most 2**PACKED_POSITION_BITS
+PACKED_FACE_INDEX_SHIFT = 3 * PACKED_POSITION_BITS
+PACKED_OCCLUSION_SHIFT = PACKED_FACE_INDEX_SHIFT + 3
+PACKED_TYPE_SHIFT = PACKED_OCCLUSION_SHIFT + 8
+
+# Lighting - baked into each face's colour when the chunk is meshed, from its face index and ambient occlusion
+# Brightness of each face direction, in the same order as FACE_NORMALS (-y is up)
+FACE_SHADING = np.array((0.85, 0.85, 0.75, 0.75, 1.0, 0.55), dtype=np.float32)
+# Brightness of a corner at each ambient occlusion level, from fully occluded (0) to unoccluded (3)
+OCCLUSION_BRIGHTNESS = np.array((0.5, 0.7, 0.85, 1.0), dtype=np.float32)
+
 
 def clamp(n, min_n, max_n):
     # 'clamp' n to be between min_n and max_n
@@ -0,0 +1,259 @@
+from settings import *
+from abc import ABC, abstractmethod
+import sqlite3
+
+
+class StorageBackend(ABC):
+    """
+    The interface every storage backend implements, so the game doesn't depend on where worlds are stored.
+    Rows are returned in the same layout as the original MySQL tables:
+        - worlds: (world_id, world_name, chunk_size, sky_colour_r, sky_colour_g, sky_colour_b, world_seed)
+        - voxel_types: (voxel_id, red, green, blue, transparent)
+
+    Voxel types are cached after the first fetch, and the cache is cleared whenever a type is added.
+    Backends that don't implement every abstract method can't be created, so a missing method fails at startup.
+    """
+    def __init__(self):
+        self.world_name = None
+        self.voxel_types_cache = None
+
+    @abstractmethod
+    def connectToWorldsDatabase(self):
+        pass
+
+    @abstractmethod
+    def connectToVoxelsDatabase(self, world_name):
+        pass
+
+    @abstractmethod
+    def fetchWorld(self, world_name):
+        pass
+
+    def fetchVoxelTypes(self):
+        if self.voxel_types_cache is None:
+            self.voxel_types_cache = self.queryVoxelTypes()
+        return self.voxel_types_cache
+
+    @abstractmethod
+    def queryVoxelTypes(self):
+        pass
+
+    @abstractmethod
+    def addWorld(self, world_name, chunk_size, sky_colour, world_seed):
+        pass
+
+    def addVoxelType(self, voxel_colour, transparent):
+        self.addVoxelTypes([(voxel_colour, transparent)])
+
+    @abstractmethod
+    def addVoxelTypes(self, voxel_types):
+        # Add a list of (colour, transparent) voxel types in one batch
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Stores every world in a single local SQLite file, so single player doesn't need a database server.
+    Passing ":memory:" keeps everything in memory, which is used by the benchmark.
+    """
+    def __init__(self, path=SQLITE_PATH):
+        super().__init__()
+        self.path = path
+        self.connection = None
+
+    def connectToWorldsDatabase(self):
+        self.connection = sqlite3.connect(self.path)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS worlds (
+                    world_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    world_name VARCHAR(20) NOT NULL UNIQUE,
+                    chunk_size INT NOT NULL,
+                    sky_colour_r INT NOT NULL,
+                    sky_colour_g INT NOT NULL,
+                    sky_colour_b INT NOT NULL,
+                    world_seed INT NOT NULL
+                )""")
+            # Voxel types of every world share one table, rather than one database per world
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS voxel_types (
+                    voxel_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    world_name VARCHAR(20) NOT NULL,
+                    red INT NOT NULL,
+                    green INT NOT NULL,
+                    blue INT NOT NULL,
+                    transparent BOOLEAN NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS voxel_types_world ON voxel_types (world_name)")
+
+    def connectToVoxelsDatabase(self, world_name):
+        # Every world is in the same file, so this only selects the world
+        self.world_name = world_name
+        self.voxel_types_cache = None
+
+    def fetchWorld(self, world_name):
+        result = self.connection.execute("SELECT * FROM worlds WHERE world_name = ?", (world_name,)).fetchall()
+
+        # Raise an exception if the world doesn't exist
+        # This means other functions can create a new world rather than using the empty list
+        if len(result) == 0:
+            raise Exception(f"{world_name} does not exist")
+
+        return result
+
+    def queryVoxelTypes(self):
+        return self.connection.execute("SELECT voxel_id, red, green, blue, transparent FROM voxel_types WHERE world_name = ? ORDER BY voxel_id",
+                                       (self.world_name,)).fetchall()
+
+    def addWorld(self, world_name, chunk_size, sky_colour, world_seed):
+        with self.connection:
+            self.connection.execute("INSERT INTO worlds (world_name, chunk_size, sky_colour_r, sky_colour_g, sky_colour_b, world_seed) VALUES (?, ?, ?, ?, ?, ?)",
+                                    (world_name, chunk_size, sky_colour[0], sky_colour[1], sky_colour[2], world_seed))
+
+    def addVoxelTypes(self, voxel_types):
+        rows = [(self.world_name, colour[0], colour[1], colour[2], transparent) for colour, transparent in voxel_types]
+        with self.connection:
+            self.connection.executemany("INSERT INTO voxel_types (world_name, red, green, blue, transparent) VALUES (?, ?, ?, ?, ?)", rows)
+        self.voxel_types_cache = None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class MySQLStorage(StorageBackend):
+    """
+    Stores worlds on a MySQL server, for shared worlds.
+    Connections come from a pool instead of being opened per database,
+    and table names are qualified with their database so one pool serves every world.
+    """
+    def __init__(self, host=MYSQL_HOST, user=MYSQL_USER, password=MYSQL_PASSWORD, pool_size=MYSQL_POOL_SIZE):
+        super().__init__()
+        self.host = host
+        self.user = user
+        self.password = password
+        self.pool_size = pool_size
+        self.pool = None
+
+    def connectToWorldsDatabase(self):
+        # mysql.connector is slow to import, so it's only imported when a MySQL server is used
+        import mysql.connector.pooling
+
+        print(f"Connecting to MySQL server at {self.host}")
+        self.pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name="voxel_game",
+            pool_size=self.pool_size,
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            )
+
+        # Creating the database if it doesn't exist is done up front, rather than after a failed connection
+        self.__execute(["CREATE DATABASE IF NOT EXISTS WorldsData",
+                        """CREATE TABLE IF NOT EXISTS WorldsData.worlds (
+                            world_id INT AUTO_INCREMENT PRIMARY KEY,
+                            world_name VARCHAR(20) NOT NULL,
+                            chunk_size INT NOT NULL,
+                            sky_colour_r INT NOT NULL,
+                            sky_colour_g INT NOT NULL,
+                            sky_colour_b INT NOT NULL,
+                            world_seed INT NOT NULL
+                        )"""])
+
+    def connectToVoxelsDatabase(self, world_name):
+        self.world_name = world_name
+        self.voxel_types_cache = None
+
+        self.__execute([f"CREATE DATABASE IF NOT EXISTS {self.__voxelsDatabase()}",
+                        f"""CREATE TABLE IF NOT EXISTS {self.__voxelsDatabase()}.voxel_types (
+                            voxel_id INT AUTO_INCREMENT PRIMARY KEY,
+                            red INT NOT NULL,
+                            green INT NOT NULL,
+                            blue INT NOT NULL,
+                            transparent BOOLEAN NOT NULL
+                        )"""])
+
+    def fetchWorld(self, world_name):
+        result = self.__query("SELECT * FROM WorldsData.worlds WHERE world_name = %s", (world_name,))
+
+        # Raise an exception if the world doesn't exist
+        # This means other functions can create a new world rather than using the empty list
+        if len(result) == 0:
+            raise Exception(f"{world_name} does not exist")
+
+        return result
+
+    def queryVoxelTypes(self):
+        return self.__query(f"SELECT * FROM {self.__voxelsDatabase()}.voxel_types ORDER BY voxel_id")
+
+    def addWorld(self, world_name, chunk_size, sky_colour, world_seed):
+        self.__executeMany("INSERT INTO WorldsData.worlds (world_name, chunk_size, sky_colour_r, sky_colour_g, sky_colour_b, world_seed) VALUES (%s, %s, %s, %s, %s, %s)",
+                           [(world_name, chunk_size, sky_colour[0], sky_colour[1], sky_colour[2], world_seed)])
+
+    def addVoxelTypes(self, voxel_types):
+        rows = [(colour[0], colour[1], colour[2], transparent) for colour, transparent in voxel_types]
+        self.__executeMany(f"INSERT INTO {self.__voxelsDatabase()}.voxel_types (red, green, blue, transparent) VALUES (%s, %s, %s, %s)", rows)
+        self.voxel_types_cache = None
+
+    def close(self):
+        # Pooled connections are committed and returned to the pool after every statement, so there's nothing left to commit
+        # Closing a pooled connection only returns it to the pool, so every connection is checked out and disconnected instead
+        if self.pool is None:
+            return
+        import mysql.connector.errors
+
+        for _ in range(self.pool_size):
+            try:
+                connection = self.pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                break  # Every connection has been checked out
+            connection.disconnect()  # Passed on to the underlying connection, which closes it
+        self.pool = None
+
+    def __voxelsDatabase(self):
+        return f"`{self.world_name}_VoxelsData`"
+
+    def __query(self, statement, parameters=()):
+        connection = self.pool.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement, parameters)
+                return cursor.fetchall()
+        finally:
+            connection.close()  # Returns the connection to the pool
+
+    def __execute(self, statements):
+        # Run several statements on one connection, in one round trip to the pool
+        connection = self.pool.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def __executeMany(self, statement, rows):
+        connection = self.pool.get_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.executemany(statement, rows)
+            connection.commit()
+        finally:
+            connection.close()
+
+
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteStorage,
+    "mysql": MySQLStorage,
+}
+
+
+def createStorage(backend=STORAGE_BACKEND):
+    # Create the storage backend selected in settings.py
+    return STORAGE_BACKENDS[backend]()